@@ -1,156 +1,250 @@
-import datetime
+import json
+import os
 import re
+import time
+from abc import ABC, abstractmethod
 
-# --- GAME STATE ---
-GIFT_UNLOCK_INTERVALS = {
-    1: datetime.timedelta(minutes=0),
-    2: datetime.timedelta(hours=3),   
-    # Add more intervals for gifts 3-6 later!
-}
-
-GIFT_STATUS = {
-    "clues": [
-        {
-            "id": 1,
-            "sub_state": 0,  # 0=Awaiting Clue Answer, 1=Awaiting Customization Request, 2=Customized
-            "gift_name": "The Birthday Bard",
-            "clue_question": "What color of dress was Harsh Wearing when you first saw him 😏?",
-            # FIX: Use a list of acceptable answers for robust checking
-            "expected_answer_list": ["blue", "cyan", "sky blue"],
-            "initial_gift_content": (
-                "My Dearest Anushka, let this humble verse begin,\n"
-                "A tale of when our two small worlds first came within.\n"
-                "The night we met, so simple yet so beautifully spun,\n"
-                "A quiet tale of destiny,where two souls became one.\n\n"
-                "We stayed awake,whisphering into the dark,\n"
-                "Every laugh,every word,every cry,striking a tender spark.\n"
-                "And then came the moment,gentle as morning dew,\n"
-                "When you breathed the words that changed my life-'Love You'\n\n"
-                "And look at us now,love,almost a year gone by,\n"
-                "My heart still dances whenever you're nearby.\n"
-                "My little girl,my joy,you're a year older too,\n"
-                "Yet every day feels brand-new,all because of you.\n\n"
-                "So let this verse, though clumsy, hold my heart's design,\n"
-                "Happy Birthday, my love. Forever yours, and mine."
-            ),
-            "customization_prompt": (
-                "Awesome! You've got the first draft. Now, time for us to reply! How should I change this poem? "
-                "Ask me to reply it *funnier*, or *roast Harsh's poetry skills*, or make it *super romantic*! just say reply and the tone you want "
-                "If you're happy with it, just tell me: **'I'm done!'**"
-            ),
-            "current_poem": "", 
-        },
-        {
-            "id": 2,
-            "sub_state": 0,
-            "gift_name": "The Digital Gallery",
-            "clue_question": "What is Harsh's favorite animal that he always promises to get you?",
-            "expected_answer_list": ["dog", "pup", "puppy"], 
-            "initial_gift_content": "<a href='#' target='_blank'>Click here to view your personalized Digital Photo Album!</a> (Hint: Don't forget to ask me for the next challenge after viewing this!)",
-            "customization_prompt": "", 
-            "current_poem": "",
-        }
-    ],
-    "completion_timestamps": {
-        # Stores completion time as a datetime object: {1: datetime.datetime(2025, 11, 29, 10, 30, 0)}
-    },
-    "history": [] 
-}
-
-# --- HELPER FUNCTION: Time Lock Checker (STABLE) ---
-
-def get_time_status(current_gift_id: int) -> str:
-    """Checks if the next gift is time-locked and returns a detailed status."""
-    
-    next_gift_id = current_gift_id + 1
-    
-    if next_gift_id > len(GIFT_STATUS["clues"]):
-        return "STATUS: ALL_GIFTS_COMPLETE"
-
-    required_interval = GIFT_UNLOCK_INTERVALS.get(next_gift_id)
-    completion_time = GIFT_STATUS["completion_timestamps"].get(current_gift_id) 
-    
-    if not completion_time or not required_interval:
-        return "STATUS: ERROR_TIME_LOG_MISSING"
-
-    time_difference = datetime.datetime.now() - completion_time
-    
-    if time_difference < required_interval:
-        time_remaining = required_interval - time_difference
-        hours = int(time_remaining.total_seconds() // 3600)
-        minutes = int((time_remaining.total_seconds() % 3600) // 60)
-        
+from conversation_memory import new_history
+
+# --- HUNT DEFINITION ---
+# Gifts, answers and unlock intervals live in hunt.json (or the file named by
+# HUNT_FILE). Everything the state machine needs per turn is compiled once at
+# load time: normalized answer sets, the exit/guardrail regexes and the
+# gift-to-next-gift ordering.
+
+HUNT_FILE = os.environ.get('HUNT_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hunt.json'))
+
+# Per-gift progress (state["sub_state"] for the active gift)
+AWAITING_UNLOCK = -1          # Previous gift finished; waiting for the time lock
+AWAITING_ANSWER = 0           # Clue question delivered
+AWAITING_CUSTOMIZATION = 1    # Gift unlocked, player is customizing it
+
+def normalize_answer(text: str) -> str:
+    return "".join(text.lower().split())
+
+class Gift:
+    """One compiled gift definition."""
+    __slots__ = (
+        "id", "gift_name", "clue_question", "answers", "initial_gift_content",
+        "customizable", "customization_prompt", "unlock_after",
+    )
+
+    def __init__(self, definition: dict):
+        self.id = definition["id"]
+        self.gift_name = definition["gift_name"]
+        self.clue_question = definition["clue_question"]
+        self.answers = frozenset(normalize_answer(ans) for ans in definition["expected_answers"])
+        self.initial_gift_content = definition["initial_gift_content"]
+        self.customizable = definition.get("customizable", False)
+        self.customization_prompt = definition.get("customization_prompt", "")
+        # Time after the previous gift is finished before this one's clue is delivered
+        self.unlock_after = definition.get("unlock_after_minutes", 0) * 60
+
+class Hunt:
+    """A compiled hunt: ordered gifts plus the precompiled turn patterns."""
+    __slots__ = ("gifts", "exit_pattern", "guardrail_pattern")
+
+    def __init__(self, definition: dict):
+        # A player's state holds the active gift's position here, so the next gift is just gifts[i + 1]
+        self.gifts = tuple(Gift(gift) for gift in definition["gifts"])
+        self.exit_pattern = re.compile(definition["exit_pattern"], re.IGNORECASE)
+        self.guardrail_pattern = re.compile(
+            "|".join(re.escape(word) for word in definition["guardrail_words"]), re.IGNORECASE
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "Hunt":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+HUNT = Hunt.load(HUNT_FILE)
+
+# --- COMMANDS ---
+# The state machine returns one of these instead of a "STATUS: ..." string.
+# app.py dispatches on the class; status_text() is the Game Master report the
+# LLM sees when a turn falls through to conversation.
+
+class Command(ABC):
+    __slots__ = ()
+    status = ""  # short name for logs and metrics, e.g. "FAILURE_CLUE"
+
+    @abstractmethod
+    def status_text(self) -> str:
+        """The Game Master report the LLM sees for this turn."""
+
+class SuccessUnlock(Command):
+    __slots__ = ("gift",)
+    status = "SUCCESS_UNLOCK"
+
+    def __init__(self, gift: Gift):
+        self.gift = gift
+
+    def status_text(self) -> str:
+        return (
+            f"STATUS: SUCCESS_UNLOCK. "
+            f"INITIAL_CONTENT: {self.gift.initial_gift_content}. "
+            f"CUSTOMIZATION_PROMPT: {self.gift.customization_prompt}"
+        )
+
+class FailureClue(Command):
+    __slots__ = ("gift", "guess")
+    status = "FAILURE_CLUE"
+
+    def __init__(self, gift: Gift, guess: str):
+        self.gift = gift
+        self.guess = guess
+
+    def status_text(self) -> str:
+        return f"STATUS: FAILURE_CLUE. The user guessed '{self.guess}'. The current question is: {self.gift.clue_question}. Give them a small, non-obvious hint."
+
+class GuardrailViolation(Command):
+    __slots__ = ()
+    status = "GUARDRAIL_VIOLATION"
+
+    def status_text(self) -> str:
+        return "STATUS: GUARDRAIL_VIOLATION. The user asked for the next step/gift. Enforce the guardrail rule."
+
+class GenerateText(Command):
+    __slots__ = ("gift", "poem", "request")
+    status = "GENERATE_TEXT"
+
+    def __init__(self, gift: Gift, poem: str, request: str):
+        self.gift = gift
+        self.poem = poem
+        self.request = request
+
+    @property
+    def prompt(self) -> str:
+        return build_rewrite_prompt(self.poem, self.request)
+
+    def status_text(self) -> str:
+        return f"AGENT_COMMAND: GENERATE_TEXT: PROMPT: {self.prompt}"
+
+class GiftLockedByTime(Command):
+    __slots__ = ("gift", "seconds_remaining")
+    status = "GIFT_LOCKED_BY_TIME"
+
+    def __init__(self, gift: Gift, seconds_remaining: float):
+        self.gift = gift
+        self.seconds_remaining = seconds_remaining
+
+    @property
+    def time_remaining(self) -> str:
+        hours = int(self.seconds_remaining // 3600)
+        minutes = int((self.seconds_remaining % 3600) // 60)
+        return f"{hours} hours and {minutes} minutes"
+
+    def status_text(self) -> str:
         return (
             f"STATUS: GIFT_LOCKED_BY_TIME. "
-            f"TIME_REMAINING: {hours} hours and {minutes} minutes. "
-            f"GIFT_NAME: {GIFT_STATUS['clues'][next_gift_id - 1]['gift_name']}"
+            f"TIME_REMAINING: {self.time_remaining}. "
+            f"GIFT_NAME: {self.gift.gift_name}"
         )
-    else:
-        # Time has passed, unlock the next clue
-        GIFT_STATUS["clues"][next_gift_id - 1]["sub_state"] = 0 # Set the new gift to active
-        return f"STATUS: DELIVER_NEXT_CLUE. NEXT_QUESTION: {GIFT_STATUS['clues'][next_gift_id - 1]['clue_question']}"
 
-# --- CORE LOGIC: Determines the next state and builds the LLM prompt ---
+class DeliverNextClue(Command):
+    __slots__ = ("gift",)
+    status = "DELIVER_NEXT_CLUE"
+
+    def __init__(self, gift: Gift):
+        self.gift = gift
+
+    def status_text(self) -> str:
+        return f"STATUS: DELIVER_NEXT_CLUE. NEXT_QUESTION: {self.gift.clue_question}"
+
+class AllGiftsComplete(Command):
+    __slots__ = ()
+    status = "ALL_GIFTS_COMPLETE"
+
+    def status_text(self) -> str:
+        return "STATUS: ALL_GIFTS_COMPLETE. The hunt is over! Deliver the final message and conclude the game."
+
+# Stateless commands are shared instead of allocated per turn
+GUARDRAIL_VIOLATION = GuardrailViolation()
+ALL_GIFTS_COMPLETE = AllGiftsComplete()
+
+# --- GAME STATE ---
+# A player's state only tracks the active gift; everything else is derived from
+# HUNT. Timestamps are epoch seconds so the state is plain JSON.
+
+def new_game_state() -> dict:
+    """Returns the state of a player who has not started the hunt yet."""
+    return {
+        "gift": 0,                     # index of the active gift (len(HUNT.gifts) once finished)
+        "sub_state": AWAITING_ANSWER,
+        "poem": "",                    # current version of the active gift's poem
+        "completed_at": None,          # when the previous gift was finished
+        "history": new_history(),      # conversation memory (see conversation_memory.py)
+    }
+
+def get_active_gift(state: dict) -> Gift | None:
+    """Returns the gift the player is working on, or None once the hunt is over."""
+    index = state["gift"]
+    return HUNT.gifts[index] if index < len(HUNT.gifts) else None
+
+def build_rewrite_prompt(current_poem: str, user_input: str) -> str:
+    return (
+        f"You are a funny and romantic rewrite specialist. Rewrite the poem entirely based on the user's request. It MUST be a reply to Harsh's poem. "
+        f"If the user asks to 'roast Harsh,' make the roast **funny and affectionate,** NEVER mean or dismissive. "
+        f"The final poem MUST be concise, under 8 lines, and suitable for a cheerful chat interface. "
+        f"Current Poem (Modify This):\n---\n{current_poem}\n-\n"
+        f"User Request: {user_input}"
+    )
 
-def generate_next_agent_prompt(user_input: str) -> str:
+# --- HELPER FUNCTION: Time Lock Checker ---
+
+def get_time_status(state: dict) -> Command:
+    """Unlocks the active gift's clue if its time lock has passed."""
+    gift = get_active_gift(state)
+    if gift is None:
+        return ALL_GIFTS_COMPLETE
+
+    elapsed = time.time() - state["completed_at"]
+    if elapsed < gift.unlock_after:
+        return GiftLockedByTime(gift, gift.unlock_after - elapsed)
+
+    state["sub_state"] = AWAITING_ANSWER
+    return DeliverNextClue(gift)
+
+def _complete_active_gift(state: dict) -> Command:
+    state["gift"] += 1
+    state["sub_state"] = AWAITING_UNLOCK
+    state["poem"] = ""
+    state["completed_at"] = time.time()
+    return get_time_status(state)
+
+# --- CORE LOGIC: Determines the next state ---
+
+def generate_next_agent_prompt(user_input: str, state: dict) -> Command:
     """
-    Manages the game state machine and generates the context prompt for the LLM.
+    Runs one turn of the hunt state machine and returns the command for app.py.
+    Mutates `state` in place; callers persist it through the session store.
     """
-    active_gift = next((clue for clue in GIFT_STATUS["clues"] if clue["sub_state"] < 2), None)
-    
-    if active_gift is None:
-        return "STATUS: ALL_GIFTS_COMPLETE. The hunt is over! Deliver the final message and conclude the game."
-        
-    current_gift_id = active_gift["id"]
-    
-    # --- REGEX CHECK FOR EXIT COMMAND (State 1) ---
-    if active_gift['sub_state'] == 1:
-        exit_match = re.search(r"i[' ]?m done|i am done|perfect", user_input.lower())
-        if exit_match:
-            active_gift["sub_state"] = 2 
-            GIFT_STATUS["completion_timestamps"][current_gift_id] = datetime.datetime.now() 
-            return get_time_status(current_gift_id)
-
-    # State 0: AWAITING CLUE ANSWER
-    if active_gift['sub_state'] == 0:
-        normalized_input = user_input.lower().strip().replace(" ", "")
-        
-        # Check if normalized input matches any item in the list
-        if normalized_input in [ans.lower().replace(" ", "") for ans in active_gift["expected_answer_list"]]:
-            active_gift["sub_state"] = 1 
-            active_gift["current_poem"] = active_gift["initial_gift_content"] 
-            
-            # If the gift is simple (Gift 2+), bypass customization
-            if active_gift['id'] > 1:
-                active_gift["sub_state"] = 2
-                GIFT_STATUS["completion_timestamps"][active_gift["id"]] = datetime.datetime.now()
-                return get_time_status(current_gift_id) 
-
-            return (
-                f"STATUS: SUCCESS_UNLOCK. "
-                f"INITIAL_CONTENT: {active_gift['initial_gift_content']}. "
-                f"CUSTOMIZATION_PROMPT: {active_gift['customization_prompt']}"
-            )
-        else:
-            return f"STATUS: FAILURE_CLUE. The user guessed '{user_input}'. The current question is: {active_gift['clue_question']}. Give them a small, non-obvious hint."
-
-    # State 1: AWAITING CUSTOMIZATION REQUEST (LLM Generation)
-    elif active_gift['sub_state'] == 1:
-        if "next" in user_input.lower() or "challenge" in user_input.lower() or "gift" in user_input.lower():
-            return "STATUS: GUARDRAIL_VIOLATION. The user asked for the next step/gift. Enforce the guardrail rule."
-        
-        # SUCCESS: User is providing a customization request. Trigger LLM call in app.py.
-        customization_prompt = (
-            f"You are a funny and romantic rewrite specialist. Rewrite the poem entirely based on the user's request. It MUST be a reply to Harsh's poem. "
-            f"If the user asks to 'roast Harsh,' make the roast **funny and affectionate,** NEVER mean or dismissive. "
-            f"The final poem MUST be concise, under 8 lines, and suitable for a cheerful chat interface. "
-            f"Current Poem (Modify This):\n---\n{active_gift['current_poem']}\n-\n"
-            f"User Request: {user_input}"
-        )
-        return f"AGENT_COMMAND: GENERATE_TEXT: PROMPT: {customization_prompt}"
+    gift = get_active_gift(state)
+    if gift is None:
+        return ALL_GIFTS_COMPLETE
+
+    sub_state = state["sub_state"]
+
+    if sub_state == AWAITING_UNLOCK:
+        return get_time_status(state)
+
+    if sub_state == AWAITING_ANSWER:
+        if normalize_answer(user_input) not in gift.answers:
+            return FailureClue(gift, user_input)
+
+        # Simple gifts are delivered straight away; only customizable ones wait for edits
+        if not gift.customizable:
+            return _complete_active_gift(state)
+
+        state["sub_state"] = AWAITING_CUSTOMIZATION
+        state["poem"] = gift.initial_gift_content
+        return SuccessUnlock(gift)
+
+    # AWAITING_CUSTOMIZATION
+    if HUNT.exit_pattern.search(user_input):
+        return _complete_active_gift(state)
 
-    # State 2: CUSTOMIZED/UNLOCKED (User must ask for the next step)
-    elif active_gift['sub_state'] == 2:
-        return get_time_status(current_gift_id)
+    if HUNT.guardrail_pattern.search(user_input):
+        return GUARDRAIL_VIOLATION
 
-    return "STATUS: UNKNOWN. Prompt the user for what they want to do next."
\ No newline at end of file
+    return GenerateText(gift, state["poem"], user_input)
@@ -1,166 +1,622 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # for the startup report
+
+import functools
+import json
 import os
+import random
+import re
 import sys
+import threading
+import uuid
 # FIX: Add the backend directory to Python's search path for deployment stability
 sys.path.append(os.path.dirname(os.path.abspath(__file__))) 
 
-from flask import Flask, request, jsonify, render_template
-from google import genai
-from google.genai import types 
-from dotenv import load_dotenv
+from flask import Flask, Response, request, jsonify, g, stream_with_context
 
 # Import tools, state, and generators
-from agent_tools import GIFT_STATUS, generate_next_agent_prompt
-from gemini_generator import generate_text_content, generate_image_content
+from agent_tools import (
+    HUNT, AWAITING_CUSTOMIZATION, AWAITING_UNLOCK, DeliverNextClue, FailureClue, GenerateText, Gift, GiftLockedByTime,
+    SuccessUnlock, build_rewrite_prompt, generate_next_agent_prompt, get_active_gift, get_time_status,
+)
+from gemini_generator import MODEL_NAME, generate_image_content, generate_agent_reply, stream_text_content, stream_agent_reply
+from conversation_memory import ConversationMemory
+import metrics
+from llm_cache import LLMCache
+from llm_gateway import CircuitBreaker, LLMGateway
+from pregen import Pregenerator
+from session_store import SESSION_MAX_AGE, create_session_store
+from startup import STARTUP_MODES, LazyClient, StartupReport
+from static_assets import StaticAssets
+from unlock_scheduler import UnlockScheduler
+
+# Google's SDK (the bulk of import time) is only imported when needed; see STARTUP MODE below
+startup = StartupReport(IMPORT_STARTED)
+startup.mark("imports")
 
 # --- CONFIGURATION FOR ABSOLUTE PATHS ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
-FRONTEND_DIR = os.path.join(BASE_DIR, '..', 'frontend') 
+FRONTEND_DIR = os.path.join(BASE_DIR, '..', 'static')
 
 # --- FIX: Explicitly Load .env file from the backend/ directory ---
 DOTENV_PATH = os.path.join(BASE_DIR, '.env')
-load_dotenv(DOTENV_PATH) 
+if os.path.exists(DOTENV_PATH):
+    with startup.phase("dotenv"):
+        from dotenv import load_dotenv
+        load_dotenv(DOTENV_PATH)
+
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+if STARTUP_MODE not in STARTUP_MODES:
+    raise ValueError(f"STARTUP_MODE must be one of {STARTUP_MODES}, got {STARTUP_MODE!r}")
 
 # --- FLASK APP SETUP ---
-app = Flask(__name__, 
-            static_folder=FRONTEND_DIR,          
-            template_folder=FRONTEND_DIR,        
-            static_url_path='')                  
+# Static files are served by the asset pipeline below, not Flask's static route
+app = Flask(__name__, static_folder=None)
+
+# --- STATIC ASSETS ---
+# Fingerprinted, precompressed copies of static/ built once per process (or
+# once in the master with --preload); see static_assets.py. Repeat visits get
+# immutable cache hits or 304s.
+static_assets = StaticAssets(
+    FRONTEND_DIR,
+    gzip_level=int(os.environ.get('STATIC_GZIP_LEVEL', '9')),
+    brotli_quality=int(os.environ.get('STATIC_BROTLI_QUALITY', '11')),
+)
+
+# --- PER-SESSION GAME STATE ---
+# Progress is keyed by a cookie so each player has their own hunt. The SQLite
+# backend is shared by all gunicorn workers; 'memory' is fine for a single process.
+SESSION_COOKIE = 'cupid_sid'
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+session_store = create_session_store(
+    os.environ.get('SESSION_STORE', 'sqlite'),
+    os.environ.get('SESSION_DB_PATH', os.path.join(BASE_DIR, 'sessions.db')),
+)
+
+@app.before_request
+def load_session_id():
+    g.started = time.perf_counter()
+    sid = request.cookies.get(SESSION_COOKIE, '')
+    g.new_session = not SESSION_ID_PATTERN.match(sid)
+    g.session_id = uuid.uuid4().hex if g.new_session else sid
+
+# Only the page and the game endpoints hand out a session. Static assets are
+# public and cached for a year, so a Set-Cookie on one could be replayed to
+# every player behind the same shared cache or CDN.
+SESSION_ROUTES = frozenset(('/', '/chat', '/chat/stream', '/events'))
+
+@app.after_request
+def save_session_cookie(response):
+    cache_control = response.headers.get('Cache-Control', '')
+    if g.get('new_session') and request.path in SESSION_ROUTES and 'public' not in cache_control:
+        response.set_cookie(SESSION_COOKIE, g.session_id, max_age=SESSION_MAX_AGE, httponly=True, samesite='Lax')
+        if cache_control and 'private' not in cache_control and 'no-store' not in cache_control:
+            response.headers['Cache-Control'] = f'private, {cache_control}'
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    _record_request(route, request.method, response.status_code, time.perf_counter() - g.started, g.session_id, g.get('turn_status'))
+    return response
+
+# --- METRICS & ACCESS LOGS ---
+# Prometheus counters and histograms are served on /metrics. Under gunicorn,
+# set METRICS_DIR (emptied before start) so every worker's numbers are merged.
+# ACCESS_LOG_JSON=1 prints one JSON line per request.
+metrics.configure(os.environ.get('METRICS_DIR') or None)
+ACCESS_LOG_JSON = os.environ.get('ACCESS_LOG_JSON', '0') == '1'
+
+def _record_request(route: str, method: str, status: int, seconds: float, session_id: str, turn_status: str | None = None):
+    """Counts and times one HTTP request (Flask and ASGI) and writes its access log line."""
+    metrics.inc("cupid_http_requests_total", route=route, code=str(status))
+    metrics.observe("cupid_http_request_seconds", seconds, route=route)
+    if ACCESS_LOG_JSON:
+        print(json.dumps({
+            "ts": round(time.time(), 3), "method": method, "route": route, "status": status,
+            "ms": round(seconds * 1000, 2), "session": session_id[:8], "turn": turn_status, "pid": os.getpid(),
+        }), flush=True)
+    metrics.ensure_flusher()
+
+# --- LLM RESPONSE CACHE ---
+# Repeated wrong guesses and rewrite requests produce byte-identical prompts;
+# those are served from here. Set LLM_CACHE_DB to keep entries across restarts.
+response_cache = LLMCache(
+    max_entries=int(os.environ.get('LLM_CACHE_SIZE', '512')),
+    ttl_seconds=float(os.environ.get('LLM_CACHE_TTL', '3600')),
+    db_path=os.environ.get('LLM_CACHE_DB') or None,
+    max_db_rows=int(os.environ.get('LLM_CACHE_DB_ROWS', '10000')),
+)
+
+# --- CONVERSATION MEMORY ---
+# Conversation turns carry the recent chat plus a rolling summary, capped at a
+# token budget so prompts stay the same size however long a session runs.
+conversation_memory = ConversationMemory(
+    token_budget=int(os.environ.get('MEMORY_TOKEN_BUDGET', '600')),
+    summary_budget=int(os.environ.get('MEMORY_SUMMARY_BUDGET', '120')),
+)
+
+def _collect_memory_metrics() -> list:
+    stats = response_cache.stats()
+    return [
+        *(("cupid_llm_cache_events_total", {"event": event}, stats[event]) for event in ("hits", "misses", "coalesced")),
+        ("cupid_memory_tokens_saved_total", {}, conversation_memory.tokens_saved),
+    ]
+
+metrics.add_collector(_collect_memory_metrics)
+
+# --- LLM GATEWAY ---
+# Every Gemini call (live, streamed or pre-generated) goes through this: it caps
+# calls in flight, sheds load past the wait queue, enforces a deadline, retries
+# transient errors and trips a circuit breaker when upstream keeps failing.
+llm_gateway = LLMGateway(
+    max_in_flight=int(os.environ.get('LLM_MAX_IN_FLIGHT', '8')),
+    async_max_in_flight=int(os.environ.get('LLM_ASYNC_MAX_IN_FLIGHT', '256')),
+    max_queue=int(os.environ.get('LLM_MAX_QUEUE', '32')),
+    queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT', '2')),
+    deadline=float(os.environ.get('LLM_DEADLINE', '20')),
+    retries=int(os.environ.get('LLM_RETRIES', '2')),
+    hedge=os.environ.get('LLM_HEDGE', '0') == '1',
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('LLM_BREAKER_FAILURES', '5')),
+        reset_after=float(os.environ.get('LLM_BREAKER_RESET', '30')),
+    ),
+)
 
 # --- GEMINI CLIENT & CONFIG SETUP ---
-try:
-    client = genai.Client()
-    SYSTEM_INSTRUCTION = (
-        "You are **Agent Cupid**, a highly personalized, witty, and charming AI assistant created by Harsh specifically for Anushka's birthday hunt. "
-        "Your tone is modern, supportive, enthusiastic, and highly familiar with Anushka and Harsh's relationship (you know their inside jokes). "
-        "**CRITICAL PERSONA RULE:** NEVER use overly formal or generic romantic filler. Use familiar, genuine language. "
-        "Your responses must be short, cheerful, and focused on the game's progress. "
-        "You manage a linear game state. "
-        "RULES:\n"
-        "1. **Check Status:** You MUST always receive a status report from the Game Master. Pay attention to the STATUS.\n"
-        "2. **Guardrail:** If the status shows 'GUARDRAIL_VIOLATION', you MUST use the exact phrase: 'Uh oh! Harsh didn't allow me to do so for this request! We must focus on the task at hand.'\n"
-    )
-    
-    AGENT_CONFIG = types.GenerateContentConfig(
+# `client` builds the real client on first use (and again in each forked worker).
+
+def _build_client():
+    if os.environ.get('GENAI_FAKE') == '1':
+        # Offline stand-in for load tests and benchmarks (see fake_genai.py and loadtest.py)
+        from fake_genai import FakeClient
+        real_client = FakeClient.from_env()
+    else:
+        from google import genai
+        from google.genai import types
+        # The HTTP timeout matches the gateway deadline so abandoned calls don't linger
+        real_client = genai.Client(http_options=types.HttpOptions(timeout=int(llm_gateway.deadline * 1000)))
+    print("Gemini Client initialized successfully.")
+    return real_client
+
+client = LazyClient(_build_client)
+
+SYSTEM_INSTRUCTION = (
+    "You are **Agent Cupid**, a highly personalized, witty, and charming AI assistant created by Harsh specifically for Anushka's birthday hunt. "
+    "Your tone is modern, supportive, enthusiastic, and highly familiar with Anushka and Harsh's relationship (you know their inside jokes). "
+    "**CRITICAL PERSONA RULE:** NEVER use overly formal or generic romantic filler. Use familiar, genuine language. "
+    "Your responses must be short, cheerful, and focused on the game's progress. "
+    "You manage a linear game state. "
+    "RULES:\n"
+    "1. **Check Status:** You MUST always receive a status report from the Game Master. Pay attention to the STATUS.\n"
+    "2. **Guardrail:** If the status shows 'GUARDRAIL_VIOLATION', you MUST use the exact phrase: 'Uh oh! Harsh didn't allow me to do so for this request! We must focus on the task at hand.'\n"
+)
+
+@functools.cache
+def agent_config():
+    """The chat GenerateContentConfig, built on first use so the SDK import can be deferred."""
+    from google.genai import types
+    return types.GenerateContentConfig(
         system_instruction=SYSTEM_INSTRUCTION,
         temperature=0.7,
         max_output_tokens=150
     )
+
+# --- SPECULATIVE PRE-GENERATION ---
+# Likely next turns (tone rewrites right after the poem unlocks, hints for wrong
+# answers) are generated in the background so they can be served instantly.
+
+def _pregen_rewrite(poem: str, tone_request: str) -> str | None:
+    return generate_agent_reply(client, build_rewrite_prompt(poem, tone_request), None, response_cache, llm_gateway, site="pregen_rewrite")
+
+def _pregen_hint(gift: Gift, variation: int) -> str | None:
+    # Served to whoever guesses wrong next, so it must not react to any particular guess
+    prompt = (
+        f"GAME_MASTER_STATUS: STATUS: FAILURE_CLUE. Give a small, non-obvious hint for: {gift.clue_question}. "
+        f"This is hint #{variation + 1}, so take a different angle than the others."
+    )
+    return generate_agent_reply(client, prompt, agent_config(), response_cache, llm_gateway, site="pregen_hint")
+
+# Hints are first queued by warmup(), once this process has a client
+pregenerator = None
+if os.environ.get('PREGEN_ENABLED', '1') == '1':
+    pregenerator = Pregenerator(_pregen_rewrite, _pregen_hint, max_workers=int(os.environ.get('PREGEN_WORKERS', '2')))
+
+# --- WARMUP ---
+# Per-process work done once before (or on) the first request: pre-render the
+# static assets and, unless STARTUP_MODE is lazy, build the client, pre-open its
+# HTTPS connection and queue pre-generated hints. It starts threads, so it never
+# runs at import (under `gunicorn --preload` that is the master, and threads, or
+# locks they hold, don't survive the fork). The post_worker_init hook in gunicorn.conf.py runs it in
+# each worker, the ASGI app on lifespan startup, and the first turn otherwise.
+
+_warm_pid = None
+_warm_lock = threading.Lock()
+
+def _open_connections():
+    try:
+        client.models.get(model=MODEL_NAME)
+    except Exception as e:
+        print(f"Warmup request failed ({type(e).__name__}): {e}")
+
+def warmup():
+    global _warm_pid
+    if _warm_pid == os.getpid():
+        return
+    with _warm_lock:
+        if _warm_pid == os.getpid():
+            return
+        _warm_pid = os.getpid()
+
+    report = StartupReport()
+    with report.phase("static_assets"):
+        static_assets.ensure_built()
+    # Lazy mode leaves the SDK and client to the first turn that calls the LLM
+    # (and so pre-generates no hints); building them here would undo it
+    if STARTUP_MODE != 'lazy':
+        with report.phase("client"):
+            ready = bool(client)
+        if ready:
+            threading.Thread(target=_open_connections, name="warmup", daemon=True).start()
+            if pregenerator:
+                pregenerator.prepare_hints(HUNT.gifts, per_clue=int(os.environ.get('PREGEN_HINTS_PER_CLUE', '3')))
+    report.report("warmup")
+
+# --- PYTHON-ONLY TURNS ---
+# Commands that need no LLM call, dispatched by command class.
+
+def _on_success_unlock(command: SuccessUnlock) -> dict:
+    gift = command.gift
+    if pregenerator:
+        pregenerator.prepare_rewrites(gift.initial_gift_content, pinned=True)
+
+    initial_content_html = gift.initial_gift_content.replace('\n', '<br>')
+    final_response = (
+        f"**YES! You got it right!**<br>Agent Cupid is thrilled to unlock your first gift: **{gift.gift_name}!**<br><br>"
+        f"***{initial_content_html}***<br><br>"
+        f"<hr style='border-top: 1px solid #ff99aa; margin: 15px 0;'>**Next Step:** {gift.customization_prompt}"
+    )
+    return {'response_text': final_response, 'agent_state': 'excited'}
+
+def _on_time_lock(command: GiftLockedByTime) -> dict:
+    final_text = (
+        f"HUH! You're a little too fast, sweetie! You've unlocked the next gift (**{command.gift.gift_name}**), "
+        f"but Harsh has put a **{command.time_remaining}** time lock on it! "
+        f"Go enjoy your poem and come back later. I'll be waiting! 😉"
+    )
+    # The page subscribes to /events and gets the next clue pushed when the lock opens
+    return {'response_text': final_text, 'agent_state': 'smiling', 'unlock_pending': True}
+
+def _on_next_clue(command: DeliverNextClue) -> dict:
+    final_text = (
+        f"Amazing! Time's up, and you're ready for the next surprise! I'm so excited for you!<br>"
+        f"Your next challenge is: **{command.gift.clue_question}**"
+    )
+    return {'response_text': final_text, 'agent_state': 'excited'}
+
+PYTHON_REPLIES = {
+    SuccessUnlock: _on_success_unlock,
+    GiftLockedByTime: _on_time_lock,
+    DeliverNextClue: _on_next_clue,
+}
+
+# --- TURN HELPERS (shared by /chat and /chat/stream) ---
+
+START_GAME = "START_GAME"  # turn status of the opening message, which has no command
+
+def _start_turn(user_message: str, session_id: str):
+    """
+    Runs the state machine for one turn. Returns (command, reply, history):
+    `reply` is a finished response when Python alone can answer, otherwise None
+    and the caller must go to the LLM with `command`. `history` is the
+    conversation context for conversation turns.
+    """
+    warmup()  # no-op once this process is warm
+
+    # 1. INITIALIZE AND START GAME
+    if user_message == "START_GAME_INIT":
+        metrics.inc("cupid_turns_total", status=START_GAME)
+        first_gift = HUNT.gifts[0]
+        return None, {
+            'response_text': f"Welcome to the hunt! I'm Agent Cupid, your guide. Your first gift, '{first_gift.gift_name},' is locked. To unlock it, answer this: **{first_gift.clue_question}**",
+            'agent_state': 'excited'
+        }, None
+
+    # 2. Get the next command from the hunt state machine.
+    # The transaction only covers the state machine step; LLM calls happen outside it.
+    with session_store.transaction(session_id) as state:
+        with metrics.span("state_machine"):
+            command = generate_next_agent_prompt(user_message, state)
+        metrics.inc("cupid_turns_total", status=command.status)
+
+        # Serve a pre-generated variant when one is ready for this exact turn
+        if pregenerator:
+            if type(command) is GenerateText:
+                ready_poem = pregenerator.take_rewrite(command.poem, user_message)
+                if ready_poem is not None:
+                    pregenerator.retire(command.poem)
+                    state["poem"] = ready_poem
+                    with metrics.span("assemble"):
+                        return command, _revision_message(ready_poem), None
+            elif type(command) is FailureClue:
+                ready_hint = pregenerator.take_hint(command.gift.id)
+                if ready_hint is not None:
+                    with metrics.span("assemble"):
+                        conversation_memory.remember(state, user_message, ready_hint)
+                        return command, _conversation_reply(ready_hint), None
+
+        # Conversation turns get the recent chat (and a summary of older chat) as context
+        handler = PYTHON_REPLIES.get(type(command))
+        history = None
+        if handler is None and type(command) is not GenerateText:
+            history = conversation_memory.context(state)
+
+    # 3. Unlocks, time locks and clue delivery are pure Python
+    if handler is None:
+        return command, None, history
+    with metrics.span("assemble"):
+        return command, handler(command), history
+
+def _revision_reply(content: str, session_id: str) -> dict:
+    """Stores the rewritten poem and formats the REVISED DRAFT message."""
+    if not content:
+        # Empty or blocked generation: keep the current poem
+        return _conversation_reply(None)
+
+    with metrics.span("assemble"):
+        with session_store.transaction(session_id) as state:
+            # The player may have said "I'm done" while this rewrite was generating
+            if state["sub_state"] == AWAITING_CUSTOMIZATION:
+                if pregenerator:
+                    pregenerator.retire(state["poem"])
+                state["poem"] = content
+        return _revision_message(content)
+
+def _revision_message(content: str) -> dict:
+    content_html = content.replace('\n', '<br>')
+    final_response = (
+        f"**REVISED DRAFT!**<br>Agent Cupid has refined the poem based on your notes:<br><br>"
+        f"***{content_html}***<br><br>**How is that? Want another edit, or are you ready to say 'I'm done!'?**"
+    )
+    return {'response_text': final_response, 'agent_state': 'excited'}
+
+def _conversation_prompt(command: str, user_message: str) -> str:
+    return f"GAME_MASTER_STATUS: {command}. USER_INPUT: {user_message}"
+
+def _finish_conversation(final_text: str | None, user_message: str, session_id: str) -> dict:
+    """Records the exchange in the session's conversation memory and formats the reply."""
+    with metrics.span("assemble"):
+        if final_text is not None:
+            with session_store.transaction(session_id) as state:
+                conversation_memory.remember(state, user_message, final_text)
+        return _conversation_reply(final_text)
+
+def _conversation_reply(final_text: str | None) -> dict:
+    if final_text is None:
+        final_text = "Agent Cupid is having a little trouble thinking right now. Please try your message again."
+        agent_state = "confused"
+    else:
+        agent_state = "smiling"
     
-    print("Gemini Client initialized successfully.")
+    if 'Uh oh! Harsh didn\'t allow me to do so' in final_text:
+        agent_state = "confused"
     
-except Exception as e:
-    print(f"FATAL: Error initializing Gemini client. Check API Key or connectivity. Error: {e}")
-    client = None
+    return {
+        'response_text': final_text.replace('\n', '<br>'),
+        'agent_state': agent_state 
+    }
+
+# Shown instead of raw exception text when Gemini is failing, slow or the
+# gateway is shedding load; the details go to the server log.
+CANNED_ERROR_REPLIES = (
+    "Oops, Cupid's arrows got tangled for a second! 💘 Give me a moment and send that again?",
+    "So many love notes flying around right now that I dropped yours! Try me again in a bit 💌",
+    "Agent Cupid is catching a breath! Please try your message again in a few seconds 😅",
+)
+
+def _error_reply(e: Exception) -> dict:
+    print(f"LLM call failed ({type(e).__name__}): {e}")
+    return {'response_text': random.choice(CANNED_ERROR_REPLIES), 'agent_state': 'confused'}
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+# --- UNLOCK NOTIFICATIONS ---
+# A player waiting on a time lock subscribes to /events. Under the ASGI app the
+# connection stays open and the scheduler pushes the next clue down it when the
+# lock opens (see unlock_scheduler.py); the Flask route answers at once and has
+# the browser reconnect when the lock is due.
+
+DELIVER_NEXT_CLUE_EVENT = 'deliver_next_clue'
+EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE', '25'))  # seconds between SSE comments, for proxies
+EVENTS_MAX_RETRY = float(os.environ.get('EVENTS_MAX_RETRY', '900'))  # longest reconnect delay the Flask route asks for
+
+def _unlock_deadline(session_id: str) -> float | None:
+    # Read-only: every /events poll lands here, and only _deliver_unlock needs the write lock
+    state = session_store.peek(session_id)
+    gift = get_active_gift(state)
+    if state["sub_state"] != AWAITING_UNLOCK or gift is None:
+        return None
+    return state["completed_at"] + gift.unlock_after
+
+def _deliver_unlock(session_id: str) -> dict | None:
+    with session_store.transaction(session_id) as state:
+        if state["sub_state"] != AWAITING_UNLOCK or get_active_gift(state) is None:
+            return None
+        command = get_time_status(state)
+    if type(command) is not DeliverNextClue:
+        return None
+    metrics.inc("cupid_turns_total", status=command.status)
+    return _on_next_clue(command)
+
+unlock_scheduler = UnlockScheduler(_unlock_deadline, _deliver_unlock)
 
 # --- WEB ROUTES ---
 
+def _static_response(path: str):
+    static_assets.ensure_built()
+    result = static_assets.respond(
+        path, request.headers.get('Accept-Encoding', ''), request.headers.get('If-None-Match', '')
+    )
+    if result is None:
+        return jsonify({'error': 'Not found'}), 404
+    status, body, headers = result
+    response = Response(body, status=status, headers=headers)
+    if status == 200 and 'Content-Encoding' not in headers:
+        # Audio players (iOS Safari in particular) fetch media in byte ranges and
+        # won't play a file whose server ignores Range; encoded variants stay whole
+        response.make_conditional(request, accept_ranges=True, complete_length=len(body))
+    return response
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return _static_response('index.html')
+
+@app.route('/<path:filename>')
+def static_file(filename):
+    return _static_response(filename)
+
+BAD_BODY_ERROR = {'error': 'Request body must be a JSON object'}
+# Only turns that need the LLM check for it: building the client is what imports the SDK in lazy mode
+CLIENT_UNAVAILABLE_REPLY = {"response_text": "AI service is unavailable. Please check the server logs for FATAL errors.", "agent_state": "confused"}
+
+def _request_message() -> str | None:
+    """The `message` field of the JSON request body, or None if the body isn't a JSON object."""
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return None
+    return payload.get('message', '')
 
 @app.route('/chat', methods=['POST'])
 def chat():
-    if not client:
-        return jsonify({"response_text": "AI service is unavailable. Please check the server logs for FATAL errors.", "agent_state": "confused"}), 500
+    user_message = _request_message()
+    if user_message is None:
+        return jsonify(BAD_BODY_ERROR), 400
     
-    user_message = request.json.get('message', '')
-    
-    # 1. INITIALIZE AND START GAME
-    if user_message == "START_GAME_INIT":
-        first_clue = GIFT_STATUS["clues"][0]['clue_question']
-        return jsonify({
-            'response_text': f"Welcome to the hunt! I'm Agent Cupid, your guide. Your first gift, 'The Birthday Bard,' is locked. To unlock it, answer this: **{first_clue}**",
-            'agent_state': 'excited'
-        })
-        
     # --- CORE AGENTIC LOOP ---
-
-    # 2. Get game status and next command from the Python State Manager
-    current_state_command = generate_next_agent_prompt(user_message)
-    
-    # 3. Handle successful CLUE UNLOCK (Python delivers content)
-    if current_state_command.startswith("STATUS: SUCCESS_UNLOCK."):
-        
-        initial_content_raw = current_state_command.split("INITIAL_CONTENT:")[1].split(". CUSTOMIZATION_PROMPT:")[0].strip()
-        customization_prompt_raw = current_state_command.split("CUSTOMIZATION_PROMPT:")[1].strip()
-        
-        final_response = (
-            f"**YES! You got it right!**<br>Agent Cupid is thrilled to unlock your first gift: **The Birthday Bard!**<br><br>"
-            f"***{initial_content_raw.replace('\n', '<br>')}***<br><br>"
-            f"<hr style='border-top: 1px solid #ff99aa; margin: 15px 0;'>**Next Step:** {customization_prompt_raw}"
-        )
-        return jsonify({'response_text': final_response, 'agent_state': 'excited'})
+    command, reply, history = _start_turn(user_message, g.session_id)
+    g.turn_status = command.status if command else START_GAME
+    if reply is not None:
+        return jsonify(reply)
+    if not client:
+        return jsonify(CLIENT_UNAVAILABLE_REPLY), 500
     
     # 4. Handle LLM call for customization
-    if current_state_command.startswith("AGENT_COMMAND: GENERATE_TEXT"):
+    if type(command) is GenerateText:
         try:
-            prompt = current_state_command.split("PROMPT:")[1].strip()
-            content = generate_text_content(client, prompt) 
-            
-            GIFT_STATUS["clues"][0]["current_poem"] = content
-            
-            final_response = (
-                f"**REVISED DRAFT!**<br>Agent Cupid has refined the poem based on your notes:<br><br>"
-                f"***{content.replace('\n', '<br>')}***<br><br>**How is that? Want another edit, or are you ready to say 'I'm done!'?**"
-            )
-            return jsonify({'response_text': final_response, 'agent_state': 'excited'})
+            content = generate_agent_reply(client, command.prompt, None, response_cache, llm_gateway, site="rewrite")
+            return jsonify(_revision_reply(content, g.session_id))
         
         except Exception as e:
-            return jsonify({'response_text': f"Agent Cupid failed to generate the gift content due to a system error. Error: {e}", 'agent_state': 'confused'})
-
-    # 5. Handle Time Lock / Next Clue Delivery (Pure Python Logic)
-    
-    if current_state_command.startswith("STATUS: GIFT_LOCKED_BY_TIME."):
-        parts = current_state_command.split('. ')
-        time_data = next(p for p in parts if p.startswith("TIME_REMAINING:"))[len("TIME_REMAINING:"):].strip()
-        gift_name = next(p for p in parts if p.startswith("GIFT_NAME:"))[len("GIFT_NAME:"):].strip()
-        
-        final_text = (
-            f"HUH! You're a little too fast, sweetie! You've unlocked the next gift (**{gift_name}**), "
-            f"but Harsh has put a **{time_data}** time lock on it! "
-            f"Go enjoy your poem and come back later. I'll be waiting! 😉"
-        )
-        return jsonify({'response_text': final_text, 'agent_state': 'smiling'})
-
-    if current_state_command.startswith("STATUS: DELIVER_NEXT_CLUE."):
-        next_clue_question = current_state_command.split("NEXT_QUESTION:")[1].strip()
-        final_text = (
-            f"Amazing! Time's up, and you're ready for the next surprise! I'm so excited for you!<br>"
-            f"Your next challenge is: **{next_clue_question}**"
-        )
-        return jsonify({'response_text': final_text, 'agent_state': 'excited'})
+            return jsonify(_error_reply(e))
 
-    # 6. Standard Conversation with Game Context (Used for Failures/Guardrails/Unknown)
-    
-    full_prompt = f"GAME_MASTER_STATUS: {current_state_command}. USER_INPUT: {user_message}"
-    history_contents = [types.Content(role='user', parts=[types.Part(text=full_prompt)])] 
+    # 5. Standard Conversation with Game Context (Used for Failures/Guardrails/Completion)
     
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=history_contents,
-            config=AGENT_CONFIG
+        final_text = generate_agent_reply(
+            client, _conversation_prompt(command.status_text(), user_message), agent_config(), response_cache, llm_gateway,
+            history=history
         )
     except Exception as e:
-        return jsonify({'response_text': f"Communication error with Gemini: {e}", 'agent_state': 'confused'})
+        return jsonify(_error_reply(e))
 
-    final_text = response.text
-    
-    if final_text is None:
-        final_text = "Agent Cupid is having a little trouble thinking right now. Please try your message again."
-        agent_state = "confused"
+    return jsonify(_finish_conversation(final_text, user_message, g.session_id))
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Same contract as /chat, delivered as Server-Sent Events: zero or more
+    `delta` events carrying raw LLM text as it arrives, then one `done` event
+    with the usual {response_text, agent_state} payload.
+    """
+    user_message = _request_message()
+    if user_message is None:
+        return jsonify(BAD_BODY_ERROR), 400
+    session_id = g.session_id
+    command, reply, history = _start_turn(user_message, session_id)
+    g.turn_status = command.status if command else START_GAME
+    if reply is None and not client:
+        return jsonify(CLIENT_UNAVAILABLE_REPLY), 500
+
+    def events():
+        if reply is not None:
+            yield _sse('done', reply)
+            return
+
+        chunks = []
+        if type(command) is GenerateText:
+            try:
+                for chunk in stream_text_content(client, command.prompt, response_cache, llm_gateway):
+                    chunks.append(chunk)
+                    yield _sse('delta', {'text': chunk})
+                yield _sse('done', _revision_reply(''.join(chunks), session_id))
+            except Exception as e:
+                yield _sse('done', _error_reply(e))
+            return
+
+        try:
+            prompt = _conversation_prompt(command.status_text(), user_message)
+            for chunk in stream_agent_reply(client, prompt, agent_config(), response_cache, llm_gateway, history=history):
+                chunks.append(chunk)
+                yield _sse('delta', {'text': chunk})
+        except Exception as e:
+            yield _sse('done', _error_reply(e))
+            return
+        yield _sse('done', _finish_conversation(''.join(chunks) if chunks else None, user_message, session_id))
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@app.route('/events')
+def events():
+    """
+    Server-Sent Events for a player waiting on a time lock: one
+    `deliver_next_clue` event with the usual {response_text, agent_state}
+    payload when the lock opens, or `idle` if there is nothing to wait for.
+
+    A sync worker can't afford to hold a connection for the hours a lock can
+    last, so this answers straight away: with the clue if the lock has opened,
+    otherwise with an SSE `retry:` delay so EventSource reconnects when it is
+    due. The ASGI app (asgi.py) holds the connection and pushes the clue instead.
+    """
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    deadline = _unlock_deadline(g.session_id)
+    if deadline is None:
+        body = _sse('idle', {})
+    elif deadline > time.time():
+        wait = min(deadline - time.time(), EVENTS_MAX_RETRY)
+        body = f"retry: {int(wait * 1000) + 250}\n: locked\n\n"
     else:
-        agent_state = "smiling"
-    
-    if 'Uh oh! Harsh didn\'t allow me to do so' in final_text:
-        agent_state = "confused"
-    
-    return jsonify({
-        'response_text': final_text.replace('\n', '<br>'),
-        'agent_state': agent_state 
-    })
+        reply = _deliver_unlock(g.session_id)
+        body = _sse(DELIVER_NEXT_CLUE_EVENT, reply) if reply is not None else _sse('idle', {})
+    return Response(body, mimetype='text/event-stream', headers=headers)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({**response_cache.stats(), 'memory_tokens_saved': conversation_memory.tokens_saved})
+
+# --- STARTUP MODE ---
+if STARTUP_MODE == 'preload':
+    # Shared by every forked worker: the SDK modules and the built assets
+    with startup.phase("sdk_import"):
+        agent_config()  # imports google.genai
+    with startup.phase("static_assets"):
+        static_assets.ensure_built()
+elif STARTUP_MODE == 'eager':
+    # The thread-free part of warmup(); the rest runs per worker
+    with startup.phase("sdk_import"):
+        agent_config()
+    with startup.phase("static_assets"):
+        static_assets.ensure_built()
+    with startup.phase("client"):
+        bool(client)  # rebuilt in each worker if this process forks
+startup.report(f"import, {STARTUP_MODE} mode")
 
 if __name__ == '__main__':
     print("--- Starting Agent Server ---")
     print("Go to http://127.0.0.1:5000/")
+    warmup()
     app.run(debug=False, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,223 @@
+# --- ASGI ENTRY POINT ---
+# The same app as backend.app:app, but /chat and /chat/stream run on asyncio and
+# the SDK's async client, so one worker process can keep hundreds of players
+# waiting on Gemini at once. Everything else (the page, static files,
+# /cache/stats, /metrics) is served by the Flask app through asgiref; /events
+# is native too so players waiting on a time lock hold no threads.
+#
+# Run with:  uvicorn backend.asgi:app --host 0.0.0.0 --port $PORT
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from http.cookies import SimpleCookie
+# Same deployment fix as app.py: make the backend modules importable
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as sync_app
+from agent_tools import GenerateText
+from gemini_generator import agenerate_agent_reply, astream_agent_reply, astream_text_content
+
+flask_asgi = WsgiToAsgi(sync_app.app)
+
+# --- ASGI HELPERS ---
+
+async def _read_json(receive) -> dict:
+    """Reads the request body as a JSON object; raises ValueError if it isn't one."""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    payload = json.loads(body or b'{}')
+    if not isinstance(payload, dict):
+        raise ValueError("request body must be a JSON object")
+    return payload
+
+def _session_id(scope) -> tuple[str, bool]:
+    """Returns (session_id, is_new) from the same cookie the Flask app uses."""
+    cookie = SimpleCookie()
+    for name, value in scope['headers']:
+        if name == b'cookie':
+            cookie.load(value.decode('latin-1'))
+    morsel = cookie.get(sync_app.SESSION_COOKIE)
+    if morsel and sync_app.SESSION_ID_PATTERN.match(morsel.value):
+        return morsel.value, False
+    return uuid.uuid4().hex, True
+
+def _headers(content_type: bytes, session_id: str, is_new: bool) -> list:
+    headers = [(b'content-type', content_type)]
+    if is_new:
+        cookie = f"{sync_app.SESSION_COOKIE}={session_id}; Max-Age={sync_app.SESSION_MAX_AGE}; HttpOnly; SameSite=Lax; Path=/"
+        headers.append((b'set-cookie', cookie.encode('latin-1')))
+    return headers
+
+async def _send_json(send, payload: dict, headers: list, status: int = 200):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode('utf-8')})
+
+# --- ASYNC CHAT ---
+# Mirrors app.chat / app.chat_stream. The state machine and session store are
+# quick local work and run in a thread; only the Gemini calls are awaited here.
+
+async def _chat_reply(turn: tuple, user_message: str, session_id: str) -> dict:
+    command, reply, history = turn
+    if reply is not None:
+        return reply
+
+    client = sync_app.client
+    if type(command) is GenerateText:
+        try:
+            content = await agenerate_agent_reply(client, command.prompt, None, sync_app.response_cache, sync_app.llm_gateway, site="rewrite")
+            return await asyncio.to_thread(sync_app._revision_reply, content, session_id)
+        except Exception as e:
+            return sync_app._error_reply(e)
+
+    try:
+        final_text = await agenerate_agent_reply(
+            client, sync_app._conversation_prompt(command.status_text(), user_message),
+            sync_app.agent_config(), sync_app.response_cache, sync_app.llm_gateway, history=history
+        )
+    except Exception as e:
+        return sync_app._error_reply(e)
+    return await asyncio.to_thread(sync_app._finish_conversation, final_text, user_message, session_id)
+
+async def _chat_events(turn: tuple, user_message: str, session_id: str):
+    command, reply, history = turn
+    if reply is not None:
+        yield sync_app._sse('done', reply)
+        return
+
+    client = sync_app.client
+    chunks = []
+    if type(command) is GenerateText:
+        try:
+            async for chunk in astream_text_content(client, command.prompt, sync_app.response_cache, sync_app.llm_gateway):
+                chunks.append(chunk)
+                yield sync_app._sse('delta', {'text': chunk})
+            reply = await asyncio.to_thread(sync_app._revision_reply, ''.join(chunks), session_id)
+            yield sync_app._sse('done', reply)
+        except Exception as e:
+            yield sync_app._sse('done', sync_app._error_reply(e))
+        return
+
+    try:
+        prompt = sync_app._conversation_prompt(command.status_text(), user_message)
+        async for chunk in astream_agent_reply(client, prompt, sync_app.agent_config(), sync_app.response_cache, sync_app.llm_gateway, history=history):
+            chunks.append(chunk)
+            yield sync_app._sse('delta', {'text': chunk})
+    except Exception as e:
+        yield sync_app._sse('done', sync_app._error_reply(e))
+        return
+    reply = await asyncio.to_thread(sync_app._finish_conversation, ''.join(chunks) if chunks else None, user_message, session_id)
+    yield sync_app._sse('done', reply)
+
+async def _handle_chat(scope, receive, send, streaming: bool):
+    started = time.perf_counter()
+    route = scope['path']
+    session_id, is_new = _session_id(scope)
+    try:
+        user_message = (await _read_json(receive)).get('message', '')
+    except ValueError:
+        await _send_json(send, sync_app.BAD_BODY_ERROR, _headers(b'application/json', session_id, is_new), status=400)
+        sync_app._record_request(route, 'POST', 400, time.perf_counter() - started, session_id)
+        return
+    turn = await asyncio.to_thread(sync_app._start_turn, user_message, session_id)
+    turn_status = turn[0].status if turn[0] else sync_app.START_GAME
+    # The first use builds the client (and in lazy mode imports the SDK), so keep it off the event loop
+    if turn[1] is None and not await asyncio.to_thread(bool, sync_app.client):
+        await _send_json(send, sync_app.CLIENT_UNAVAILABLE_REPLY, _headers(b'application/json', session_id, is_new), status=500)
+        sync_app._record_request(route, 'POST', 500, time.perf_counter() - started, session_id, turn_status)
+        return
+
+    if not streaming:
+        reply = await _chat_reply(turn, user_message, session_id)
+        await _send_json(send, reply, _headers(b'application/json', session_id, is_new))
+        sync_app._record_request(route, 'POST', 200, time.perf_counter() - started, session_id, turn_status)
+        return
+
+    headers = _headers(b'text/event-stream', session_id, is_new)
+    headers += [(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    # Timed to the response headers, like the Flask app's streamed responses
+    sync_app._record_request(route, 'POST', 200, time.perf_counter() - started, session_id, turn_status)
+    async for event in _chat_events(turn, user_message, session_id):
+        await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+# --- UNLOCK EVENTS ---
+# Same events as app.events, but the connection stays open until the scheduler
+# pushes the clue: here a waiting player costs an idle connection and a queue,
+# not a thread. A disconnect is noticed at once and unsubscribes, so the
+# scheduler doesn't unlock a gift for a page that has gone away.
+
+async def _wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+async def _handle_events(scope, receive, send):
+    session_id, is_new = _session_id(scope)
+    loop = asyncio.get_running_loop()
+    replies = asyncio.Queue()
+    unsubscribe = await asyncio.to_thread(
+        sync_app.unlock_scheduler.subscribe, session_id, lambda reply: loop.call_soon_threadsafe(replies.put_nowait, reply)
+    )
+
+    headers = _headers(b'text/event-stream', session_id, is_new)
+    headers += [(b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    if unsubscribe is None:
+        await send({'type': 'http.response.body', 'body': sync_app._sse('idle', {}).encode('utf-8')})
+        return
+
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        retry = f"retry: {int(sync_app.EVENTS_KEEPALIVE * 1000)}\n\n"
+        await send({'type': 'http.response.body', 'body': retry.encode('utf-8'), 'more_body': True})
+        while True:
+            next_reply = asyncio.ensure_future(replies.get())
+            done, _ = await asyncio.wait({next_reply, disconnected}, timeout=sync_app.EVENTS_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected in done:
+                next_reply.cancel()
+                return
+            if next_reply not in done:
+                next_reply.cancel()
+                await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                continue
+            reply = next_reply.result()
+            event = sync_app._sse(sync_app.DELIVER_NEXT_CLUE_EVENT, reply) if reply is not None else sync_app._sse('idle', {})
+            await send({'type': 'http.response.body', 'body': event.encode('utf-8')})
+            return
+    finally:
+        disconnected.cancel()
+        unsubscribe()
+
+# --- ASGI APPLICATION ---
+
+CHAT_ROUTES = {'/chat': False, '/chat/stream': True}
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.to_thread(sync_app.warmup)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in CHAT_ROUTES:
+        await _handle_chat(scope, receive, send, streaming=CHAT_ROUTES[scope['path']])
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == '/events':
+        await _handle_events(scope, receive, send)
+        return
+
+    await flask_asgi(scope, receive, send)
@@ -0,0 +1,80 @@
+import re
+import threading
+
+# --- CONVERSATION MEMORY ---
+# Each session keeps its recent chat turns in state["history"]. Once the turns
+# go over the token budget, the oldest ones are folded into a short running
+# summary, so the context sent to Gemini stays roughly the same size no matter
+# how long the player has been chatting.
+#
+# Summaries are extractive (first sentence of each folded turn) rather than
+# LLM-written: folding happens on the request path and must not add a round trip.
+
+ROLE_NAMES = {"u": "user", "m": "model"}
+SPEAKER_NAMES = {"u": "Anushka", "m": "Cupid"}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English chat text)."""
+    return max(1, len(text) // 4)
+
+def _first_sentence(text: str, max_chars: int = 90) -> str:
+    sentence = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 1] + "…"
+
+def new_history() -> dict:
+    return {
+        "summary": "",
+        "turns": [],          # [["u" | "m", text], ...], oldest first
+        "seen_tokens": 0,     # tokens of every turn ever recorded
+        "tokens_saved": 0,    # prompt tokens avoided compared to sending the full history
+    }
+
+class ConversationMemory:
+    """Token-budgeted rolling window of chat turns with an extractive summary."""
+
+    def __init__(self, token_budget: int = 600, summary_budget: int = 120, max_turn_chars: int = 600):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_turn_chars = max_turn_chars
+        self.tokens_saved = 0  # across all sessions in this process
+        self._lock = threading.Lock()
+
+    def remember(self, state: dict, user_text: str, model_text: str):
+        """Records one exchange and folds old turns into the summary if over budget."""
+        history = state.setdefault("history", new_history())
+        for role, text in (("u", user_text), ("m", model_text)):
+            text = text.strip()[:self.max_turn_chars]
+            history["turns"].append([role, text])
+            history["seen_tokens"] += estimate_tokens(text)
+
+        while len(history["turns"]) > 2 and self._turn_tokens(history) > self.token_budget:
+            role, text = history["turns"].pop(0)
+            history["summary"] = self._fold(history["summary"], f"{SPEAKER_NAMES[role]}: {_first_sentence(text)}")
+
+    def context(self, state: dict) -> list:
+        """
+        Returns the (role, text) turns to send before the new prompt and counts
+        the tokens this saved against replaying the whole conversation.
+        """
+        history = state.get("history") or new_history()
+        turns = []
+        if history["summary"]:
+            turns.append(("user", f"EARLIER_CONVERSATION_SUMMARY: {history['summary']}"))
+        turns.extend((ROLE_NAMES[role], text) for role, text in history["turns"])
+
+        saved = max(0, history["seen_tokens"] - sum(estimate_tokens(text) for _, text in turns))
+        if saved:
+            history["tokens_saved"] += saved
+            with self._lock:
+                self.tokens_saved += saved
+        return turns
+
+    def _turn_tokens(self, history: dict) -> int:
+        return sum(estimate_tokens(text) for _, text in history["turns"])
+
+    def _fold(self, summary: str, line: str) -> str:
+        parts = [p for p in summary.split(" | ") if p] + [line]
+        # Keep the newest facts; drop the oldest ones once the summary is full
+        while len(parts) > 1 and estimate_tokens(" | ".join(parts)) > self.summary_budget:
+            parts.pop(0)
+        return " | ".join(parts)
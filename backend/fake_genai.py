@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+
+from google.genai import errors, types
+
+# --- OFFLINE GEMINI STAND-IN ---
+# Quacks like genai.Client for the calls this app makes (models.generate_content,
+# models.generate_content_stream, their client.aio counterparts, and models.get
+# for warmup), with configurable latency, error rate and streaming, so the
+# server can be load tested without an API key or quota. Set GENAI_FAKE=1 to make app.py use it,
+# or pass a FakeClient wherever gemini_generator expects a client.
+
+FILLER = (
+    "Ooh so close, sweetie! Think back to that first night and what caught your eye. "
+    "Harsh remembers every little detail, and I bet you do too. Take another guess!"
+).split()
+
+class LatencyModel:
+    """
+    Samples a delay in seconds from a spec string:
+    "0.3" or "fixed:0.3", "uniform:LOW,HIGH", "normal:MEAN,STDDEV" or
+    "lognormal:MEDIAN,SIGMA" (the long tail real LLM APIs tend to have).
+    """
+
+    def __init__(self, spec: str = "0", rng: random.Random | None = None):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        if not args:
+            kind, args = "fixed", kind
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",")]
+        self.rng = rng or random.Random()
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+    def sample(self) -> float:
+        a = self.args
+        if self.kind == "fixed":
+            return a[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(a[0], a[1])
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(a[0], a[1]))
+        return a[0] * self.rng.lognormvariate(0, a[1])
+
+def _contents_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    return "\n".join(part.text or "" for content in contents for part in content.parts)
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class _FakeModels:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    def generate_content(self, model: str, contents, config=None) -> types.GenerateContentResponse:
+        delay, error = self._client._plan()
+        time.sleep(delay)
+        if error:
+            raise error
+        return self._client._response(model, contents, self._client._reply_text(contents))
+
+    def generate_content_stream(self, model: str, contents, config=None):
+        delay, error = self._client._plan()
+        time.sleep(delay)
+        if error:
+            raise error
+        for i, piece in enumerate(self._client._chunks(contents)):
+            if i:
+                time.sleep(self._client.chunk_interval)
+            yield self._client._response(model, contents, piece)
+
+    def get(self, model: str) -> types.Model:
+        time.sleep(self._client.latency.sample())
+        return types.Model(name=f"models/{model}")
+
+class _FakeAsyncModels:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None) -> types.GenerateContentResponse:
+        delay, error = self._client._plan()
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return self._client._response(model, contents, self._client._reply_text(contents))
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        delay, error = self._client._plan()
+
+        async def chunks():
+            await asyncio.sleep(delay)
+            if error:
+                raise error
+            for i, piece in enumerate(self._client._chunks(contents)):
+                if i:
+                    await asyncio.sleep(self._client.chunk_interval)
+                yield self._client._response(model, contents, piece)
+
+        return chunks()
+
+class _FakeAio:
+    def __init__(self, client: "FakeClient"):
+        self.models = _FakeAsyncModels(client)
+
+class FakeClient:
+    """
+    Offline genai.Client. Each call waits `latency` (time to first chunk when
+    streaming), then fails with probability `error_rate` by raising the SDK's
+    own APIError for `error_code`, so retries and the breaker behave as in
+    production. Replies are deterministic per prompt and carry usage_metadata.
+    """
+
+    def __init__(self, latency: str = "lognormal:0.6,0.4", error_rate: float = 0.0, error_code: int = 503,
+                 reply_words: int = 30, stream_chunks: int = 4, chunk_interval: float = 0.05, seed: int | None = None):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.reply_words = reply_words
+        self.stream_chunks = stream_chunks
+        self.chunk_interval = chunk_interval
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "FakeClient":
+        seed = os.environ.get('FAKE_GENAI_SEED')
+        return cls(
+            latency=os.environ.get('FAKE_GENAI_LATENCY', 'lognormal:0.6,0.4'),
+            error_rate=float(os.environ.get('FAKE_GENAI_ERROR_RATE', '0')),
+            error_code=int(os.environ.get('FAKE_GENAI_ERROR_CODE', '503')),
+            reply_words=int(os.environ.get('FAKE_GENAI_REPLY_WORDS', '30')),
+            stream_chunks=int(os.environ.get('FAKE_GENAI_CHUNKS', '4')),
+            chunk_interval=float(os.environ.get('FAKE_GENAI_CHUNK_INTERVAL', '0.05')),
+            seed=int(seed) if seed else None,
+        )
+
+    def _plan(self) -> tuple[float, Exception | None]:
+        """Decides this call's delay and whether it fails."""
+        with self._lock:
+            self.calls += 1
+            delay = self.latency.sample()
+            failed = self.rng.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if not failed:
+            return delay, None
+        status = "UNAVAILABLE" if self.error_code >= 500 else "RESOURCE_EXHAUSTED"
+        error_class = errors.ServerError if self.error_code >= 500 else errors.ClientError
+        return delay, error_class(self.error_code, {"error": {"code": self.error_code, "message": "Fake upstream error", "status": status}})
+
+    def _reply_text(self, contents) -> str:
+        digest = hashlib.sha256(_contents_text(contents).encode("utf-8")).digest()
+        start = digest[0] % len(FILLER)
+        words = [FILLER[(start + i) % len(FILLER)] for i in range(self.reply_words)]
+        return f"[{digest[:3].hex()}] " + " ".join(words)
+
+    def _chunks(self, contents) -> list[str]:
+        words = self._reply_text(contents).split(" ")
+        size = max(1, -(-len(words) // self.stream_chunks))
+        return [" ".join(words[i:i + size]) + (" " if i + size < len(words) else "") for i in range(0, len(words), size)]
+
+    def _response(self, model: str, contents, text: str) -> types.GenerateContentResponse:
+        prompt_tokens = _estimate_tokens(_contents_text(contents))
+        reply_tokens = _estimate_tokens(text)
+        return types.GenerateContentResponse(
+            model_version=model,
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[types.Part(text=text)]))],
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=reply_tokens,
+                total_token_count=prompt_tokens + reply_tokens,
+            ),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
@@ -1,22 +1,169 @@
-from google import genai
-import os
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+
+import metrics
+from llm_cache import LLMCache, make_key
+from llm_gateway import LLMGateway
+
+if TYPE_CHECKING:
+    from google import genai
+
+# google.genai is imported on first use (see startup.py): it dominates import time.
 
 # --- CONTENT GENERATION ---
+# Every call goes through an optional LLMCache: a byte-identical request (same
+# model, normalized prompt and config) is answered without calling Gemini.
+# Cache misses go through an optional LLMGateway, which bounds concurrency,
+# enforces deadlines and retries transient errors. Each upstream call is
+# recorded in metrics under its call site (`site`), with usage_metadata tokens.
+
+MODEL_NAME = "gemini-2.5-flash"
+
+def _user_contents(prompt: str, history: list | None = None) -> list:
+    """Builds the request contents: earlier (role, text) turns, then the new prompt."""
+    from google.genai import types
+    turns = list(history or []) + [('user', prompt)]
+    return [types.Content(role=role, parts=[types.Part(text=text)]) for role, text in turns]
+
+def _cache_key(prompt: str, config, history: list | None) -> str:
+    # The conversation so far is part of what the model sees, so it is part of the key
+    context = ''.join(f"{role}: {text}\n" for role, text in history or [])
+    return make_key(MODEL_NAME, context + prompt, config)
+
+def _generate(client: "genai.Client", prompt: str, config, cache: LLMCache | None, gateway: LLMGateway | None, history: list | None = None, site: str = "chat") -> str | None:
+    def request():
+        started = time.perf_counter()
+        try:
+            response = client.models.generate_content(
+                model=MODEL_NAME,
+                contents=_user_contents(prompt, history),
+                config=config
+            )
+        except Exception:
+            metrics.record_llm_call(site, time.perf_counter() - started, error=True)
+            raise
+        metrics.record_llm_call(site, time.perf_counter() - started, response.usage_metadata)
+        return response.text
+
+    call = (lambda: gateway.call(request)) if gateway is not None else request
+    if cache is None:
+        return call()
+    return cache.get_or_compute(_cache_key(prompt, config, history), call)
+
+def generate_agent_reply(client: "genai.Client", prompt: str, config, cache: LLMCache | None = None, gateway: LLMGateway | None = None, history: list | None = None, site: str = "chat") -> str | None:
+    """Generates an Agent Cupid chat reply. API errors propagate to the caller."""
+    return _generate(client, prompt, config, cache, gateway, history, site)
+
+# --- STREAMING GENERATION ---
+# Used by /chat/stream. API errors raise even after some text has been yielded,
+# so the caller can replace the partial reply it already sent to the browser.
+
+def stream_text_content(client: "genai.Client", prompt: str, cache: LLMCache | None = None, gateway: LLMGateway | None = None, site: str = "rewrite") -> Iterator[str]:
+    """Streams a poem rewrite (no system instruction); yields text chunks as they arrive."""
+    return stream_agent_reply(client, prompt, None, cache, gateway, site=site)
 
-def generate_text_content(client: genai.Client, prompt: str) -> str:
-    """Uses Gemini 2.5 Flash to generate personalized text content (poem or story)."""
-    try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[prompt],
-            config=None
-        )
+def stream_agent_reply(client: "genai.Client", prompt: str, config, cache: LLMCache | None = None, gateway: LLMGateway | None = None, history: list | None = None, site: str = "chat") -> Iterator[str]:
+    """Streams a Gemini 2.5 Flash reply. A cache hit is yielded as a single chunk."""
+    key = _cache_key(prompt, config, history) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    def open_stream():
+        started = time.perf_counter()
+        usage = None
+        try:
+            for chunk in client.models.generate_content_stream(
+                model=MODEL_NAME,
+                contents=_user_contents(prompt, history),
+                config=config
+            ):
+                usage = chunk.usage_metadata or usage  # the last chunk carries the totals
+                yield chunk
+        except Exception:
+            metrics.record_llm_call(site, time.perf_counter() - started, error=True)
+            raise
+        metrics.record_llm_call(site, time.perf_counter() - started, usage)
+
+    chunks = []
+    for chunk in (gateway.stream(open_stream) if gateway is not None else open_stream()):
+        if chunk.text:
+            chunks.append(chunk.text)
+            yield chunk.text
+
+    if key is not None and chunks:
+        cache.put(key, ''.join(chunks))
+
+# --- ASYNC GENERATION ---
+# Same behaviour as above on the SDK's asyncio client (client.aio), used by the
+# ASGI entry point so one worker can keep many Gemini calls in flight.
+
+async def _agenerate(client: "genai.Client", prompt: str, config, cache: LLMCache | None, gateway: LLMGateway | None, history: list | None = None, site: str = "chat") -> str | None:
+    async def request():
+        started = time.perf_counter()
+        try:
+            response = await client.aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=_user_contents(prompt, history),
+                config=config
+            )
+        except Exception:
+            metrics.record_llm_call(site, time.perf_counter() - started, error=True)
+            raise
+        metrics.record_llm_call(site, time.perf_counter() - started, response.usage_metadata)
         return response.text
-    except Exception as e:
-        return f"ERROR: Failed to generate content due to API issue: {e}"
+
+    call = (lambda: gateway.acall(request)) if gateway is not None else request
+    if cache is None:
+        return await call()
+    return await cache.aget_or_compute(_cache_key(prompt, config, history), call)
+
+async def agenerate_agent_reply(client: "genai.Client", prompt: str, config, cache: LLMCache | None = None, gateway: LLMGateway | None = None, history: list | None = None, site: str = "chat") -> str | None:
+    """Async version of generate_agent_reply. API errors propagate to the caller."""
+    return await _agenerate(client, prompt, config, cache, gateway, history, site)
+
+def astream_text_content(client: "genai.Client", prompt: str, cache: LLMCache | None = None, gateway: LLMGateway | None = None, site: str = "rewrite") -> AsyncIterator[str]:
+    """Async version of stream_text_content."""
+    return astream_agent_reply(client, prompt, None, cache, gateway, site=site)
+
+async def astream_agent_reply(client: "genai.Client", prompt: str, config, cache: LLMCache | None = None, gateway: LLMGateway | None = None, history: list | None = None, site: str = "chat") -> AsyncIterator[str]:
+    """Async version of stream_agent_reply."""
+    key = _cache_key(prompt, config, history) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    async def open_stream():
+        started = time.perf_counter()
+        usage = None
+        try:
+            async for chunk in await client.aio.models.generate_content_stream(
+                model=MODEL_NAME,
+                contents=_user_contents(prompt, history),
+                config=config
+            ):
+                usage = chunk.usage_metadata or usage
+                yield chunk
+        except Exception:
+            metrics.record_llm_call(site, time.perf_counter() - started, error=True)
+            raise
+        metrics.record_llm_call(site, time.perf_counter() - started, usage)
+
+    chunks = []
+    async for chunk in (gateway.astream(open_stream) if gateway is not None else open_stream()):
+        if chunk.text:
+            chunks.append(chunk.text)
+            yield chunk.text
+
+    if key is not None and chunks:
+        cache.put(key, ''.join(chunks))
 
 # Placeholder function for future image generation (Gift 3)
-def generate_image_content(client: genai.Client, prompt: str) -> str:
+def generate_image_content(client: "genai.Client", prompt: str) -> str:
     """
     Placeholder for image generation. Returns a high-quality placeholder image
     since full image generation requires more complex configuration for free tier.
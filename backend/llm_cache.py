@@ -0,0 +1,211 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable
+
+from sqlite_connections import LocalConnections
+
+# --- CACHE KEYS ---
+
+def normalize_prompt(prompt: str) -> str:
+    """Drops whitespace differences that don't change what the model sees."""
+    return "\n".join(line.strip() for line in prompt.strip().splitlines())
+
+def config_fingerprint(config) -> dict | None:
+    """Reduces a GenerateContentConfig to the plain fields that affect the output."""
+    if config is None:
+        return None
+    model_dump = getattr(config, "model_dump", None)
+    return model_dump(exclude_none=True, mode="json") if model_dump else vars(config)
+
+def make_key(model: str, prompt: str, config=None) -> str:
+    """Content address of one LLM request: (model, normalized prompt, config)."""
+    material = json.dumps(
+        [model, normalize_prompt(prompt), config_fingerprint(config)],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+# --- RESPONSE CACHE ---
+
+class LLMCache:
+    """
+    LRU + TTL cache of LLM text responses with an optional SQLite tier that
+    survives restarts, and single-flight coalescing of identical requests.
+    The SQLite tier is purged of expired rows and capped at `max_db_rows`
+    (soonest-expiring first) at most once every `purge_interval` seconds.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600, db_path: str | None = None,
+                 max_db_rows: int = 10000, purge_interval: float = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.max_db_rows = max_db_rows
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._entries = OrderedDict()  # key -> (expires_at, text)
+        self._inflight = {}            # key -> Future shared by concurrent callers
+        self._ainflight = {}           # key -> asyncio.Future, same for async callers
+        self._lock = threading.Lock()
+        self._connections = LocalConnections(db_path) if db_path else None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if db_path:
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    def _remember(self, key: str, text: str, expires_at: float):
+        # Caller holds self._lock.
+        self._entries[key] = (expires_at, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> str | None:
+        """Returns a live cached response or None, counting the hit or miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.db_path:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, text, expires_at)
+        if self.db_path:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, text, expires_at),
+            )
+            self._maybe_purge()
+
+    def purge(self) -> int:
+        """Deletes expired SQLite rows, then the soonest-expiring ones beyond max_db_rows."""
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_db_rows
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY expires_at LIMIT ?)", (excess,)
+            ).rowcount
+        return removed
+
+    def _maybe_purge(self):
+        with self._lock:
+            if time.monotonic() < self._next_purge:
+                return
+            self._next_purge = time.monotonic() + self.purge_interval
+        try:
+            self.purge()
+        except sqlite3.OperationalError as e:
+            print(f"Could not purge the LLM cache: {e}")
+
+    def get_or_compute(self, key: str, compute: Callable[[], str | None]) -> str | None:
+        """
+        Returns the cached response for `key`, or runs `compute` once and caches
+        its result. Concurrent callers with the same key wait for that one call.
+        Failures and empty (None) responses are never cached.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return pending.result()
+
+        try:
+            text = compute()
+            if text is not None:
+                self.put(key, text)
+            pending.set_result(text)
+            return text
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    async def aget_or_compute(self, key: str, compute: Callable[[], Awaitable[str | None]]) -> str | None:
+        """
+        asyncio counterpart of get_or_compute for the ASGI entry point.
+        Coalescing is per event loop, which is one per worker process.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        pending = self._ainflight.get(key)
+        if pending is not None:
+            with self._lock:
+                self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        pending = self._ainflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            text = await compute()
+            if text is not None:
+                self.put(key, text)
+            pending.set_result(text)
+            return text
+        except asyncio.CancelledError:
+            pending.cancel()
+            raise
+        except Exception as e:
+            pending.set_exception(e)
+            # Nobody may be waiting; don't let asyncio warn about an unretrieved exception
+            pending.exception()
+            raise
+        finally:
+            del self._ainflight[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,350 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import aclosing, closing
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+# --- ERRORS ---
+# Raised instead of the upstream exception when the gateway gives up; app.py
+# turns all of them into a canned 'confused' reply.
+
+class GatewayError(Exception):
+    pass
+
+class Overloaded(GatewayError):
+    """Too many calls in flight and the wait queue is full or timed out."""
+
+class CircuitOpen(GatewayError):
+    """Upstream has been failing; calls are refused until the breaker resets."""
+
+class DeadlineExceeded(GatewayError):
+    """The call (including retries) did not finish within its deadline."""
+
+def is_retryable(e: Exception) -> bool:
+    """Retries everything except client errors; 408 and 429 are worth another try."""
+    code = getattr(e, "code", None)
+    return not (isinstance(code, int) and 400 <= code < 500 and code not in (408, 429))
+
+# --- CIRCUIT BREAKER ---
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. After `reset_after`
+    seconds it half-opens: one probe call is let through, and its outcome
+    closes the breaker or opens it again. A probe that never reports back
+    (e.g. the caller went away) is replaced after another `reset_after`.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self._failures = 0
+        self._opened_at = None
+        self._probe_until = None  # set while a half-open probe is in flight
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self._opened_at < self.reset_after else "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_after:
+                return False
+            if self._probe_until is not None and now < self._probe_until:
+                return False  # another caller is already probing
+            self._probe_until = now + self.reset_after
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_until = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                # A failed probe re-opens the breaker for another reset_after
+                self._opened_at = time.monotonic()
+                self._probe_until = None
+
+# --- GATEWAY ---
+
+class LLMGateway:
+    """
+    Single choke point for upstream LLM calls: bounded in-flight calls with a
+    bounded wait queue (load shedding beyond it), a deadline per call, retries
+    with jittered exponential backoff, optional hedging once a call is slower
+    than the recent p95, and a circuit breaker.
+    """
+
+    def __init__(self, max_in_flight: int = 8, async_max_in_flight: int = 256, max_queue: int = 32, queue_timeout: float = 2.0,
+                 deadline: float = 20.0, retries: int = 2, backoff_base: float = 0.25, backoff_max: float = 2.0,
+                 hedge: bool = False, hedge_min_samples: int = 20, breaker: CircuitBreaker | None = None):
+        self.max_in_flight = max_in_flight
+        # An asyncio worker holds no thread per call, so it can afford far more in flight
+        self.async_max_in_flight = async_max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._aslots = None  # asyncio.Semaphore, created on the worker's event loop
+        self._waiting = 0
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        # Hedged attempts need a second thread, so the pool is twice the slot count
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight * 2, thread_name_prefix="llm")
+
+    # --- bookkeeping ---
+
+    def _hedge_delay(self) -> float | None:
+        """Seconds to wait before hedging: the p95 of recent successful calls."""
+        if not self.hedge:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def _record_success(self, latency: float):
+        with self._lock:
+            self._latencies.append(latency)
+        self.breaker.record_success()
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": spreads retries out so a blip doesn't cause a retry stampede
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _admit(self):
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM circuit breaker is open")
+        if self._slots.acquire(blocking=False):
+            return
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise Overloaded("LLM wait queue is full")
+            self._waiting += 1
+        try:
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                raise Overloaded("Timed out waiting for an LLM slot")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    async def _aadmit(self):
+        if not self.breaker.allow():
+            raise CircuitOpen("LLM circuit breaker is open")
+        if self._aslots is None:
+            self._aslots = asyncio.Semaphore(self.async_max_in_flight)
+        if not self._aslots.locked():
+            await self._aslots.acquire()  # free slot: returns without suspending
+            return
+        with self._lock:
+            if self._waiting >= self.max_queue:
+                raise Overloaded("LLM wait queue is full")
+            self._waiting += 1
+        try:
+            await asyncio.wait_for(self._aslots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise Overloaded("Timed out waiting for an LLM slot") from None
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    # --- blocking calls ---
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Runs `fn` (one upstream request) under admission control, deadline, retries and hedging."""
+        self._admit()
+        try:
+            return self._call_with_retries(fn, time.monotonic() + self.deadline)
+        finally:
+            self._slots.release()
+
+    def _call_with_retries(self, fn: Callable[[], T], deadline_at: float) -> T:
+        for attempt in range(self.retries + 1):
+            try:
+                return self._attempt(fn, deadline_at)
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise  # a bad request says nothing about upstream health
+                delay = self._backoff(attempt)
+                if attempt == self.retries or time.monotonic() + delay >= deadline_at:
+                    self.breaker.record_failure()
+                    raise
+                time.sleep(delay)
+
+    def _attempt(self, fn: Callable[[], T], deadline_at: float) -> T:
+        started = time.monotonic()
+        futures = {self._executor.submit(fn)}
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None:
+            done, _ = wait(futures, timeout=min(hedge_delay, max(0, deadline_at - started)))
+            if not done:
+                futures.add(self._executor.submit(fn))
+
+        error = None
+        while futures:
+            done, futures = wait(futures, timeout=max(0, deadline_at - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    for other in futures:
+                        other.cancel()
+                    self._record_success(time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+
+        if error is not None and not futures:
+            raise error
+        # The worker thread finishes on its own; the client's HTTP timeout bounds it.
+        raise DeadlineExceeded(f"LLM call exceeded its {self.deadline:.0f}s deadline")
+
+    def stream(self, open_stream: Callable[[], Iterator[T]]) -> Iterator[T]:
+        """
+        Streams through the gateway. Failures before the first chunk are retried;
+        once text has reached the caller the error is raised as-is. The deadline
+        is checked as each chunk arrives (a stalled read is bounded by the
+        client's HTTP timeout, which app.py sets to the same deadline).
+        """
+        self._admit()
+        try:
+            deadline_at = time.monotonic() + self.deadline
+            for attempt in range(self.retries + 1):
+                started = time.monotonic()
+                emitted = False
+                try:
+                    with closing(open_stream()) as chunks:
+                        for chunk in chunks:
+                            if time.monotonic() > deadline_at:
+                                raise DeadlineExceeded(f"LLM stream exceeded its {self.deadline:.0f}s deadline")
+                            emitted = True
+                            yield chunk
+                    self._record_success(time.monotonic() - started)
+                    return
+                except DeadlineExceeded:
+                    self.breaker.record_failure()
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    delay = self._backoff(attempt)
+                    if emitted or attempt == self.retries or time.monotonic() + delay >= deadline_at:
+                        self.breaker.record_failure()
+                        raise
+                    time.sleep(delay)
+        finally:
+            self._slots.release()
+
+    # --- asyncio calls ---
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """asyncio counterpart of call()."""
+        await self._aadmit()
+        try:
+            deadline_at = time.monotonic() + self.deadline
+            for attempt in range(self.retries + 1):
+                try:
+                    return await self._aattempt(fn, deadline_at)
+                except DeadlineExceeded:
+                    self.breaker.record_failure()
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    delay = self._backoff(attempt)
+                    if attempt == self.retries or time.monotonic() + delay >= deadline_at:
+                        self.breaker.record_failure()
+                        raise
+                    await asyncio.sleep(delay)
+        finally:
+            self._aslots.release()
+
+    async def _aattempt(self, fn: Callable[[], Awaitable[T]], deadline_at: float) -> T:
+        started = time.monotonic()
+        tasks = {asyncio.ensure_future(fn())}
+        try:
+            hedge_delay = self._hedge_delay()
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=min(hedge_delay, max(0, deadline_at - started)))
+                if not done:
+                    tasks.add(asyncio.ensure_future(fn()))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=max(0, deadline_at - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        self._record_success(time.monotonic() - started)
+                        return task.result()
+                    error = task.exception()
+
+            if error is not None and not tasks:
+                raise error
+            raise DeadlineExceeded(f"LLM call exceeded its {self.deadline:.0f}s deadline")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """asyncio counterpart of stream(); here a stalled read is cut off at the deadline too."""
+        await self._aadmit()
+        try:
+            deadline_at = time.monotonic() + self.deadline
+            for attempt in range(self.retries + 1):
+                started = time.monotonic()
+                emitted = False
+                try:
+                    async with aclosing(open_stream()) as chunks:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(anext(chunks), max(0, deadline_at - time.monotonic()))
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                raise DeadlineExceeded(f"LLM stream exceeded its {self.deadline:.0f}s deadline") from None
+                            emitted = True
+                            yield chunk
+                    self._record_success(time.monotonic() - started)
+                    return
+                except DeadlineExceeded:
+                    self.breaker.record_failure()
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    delay = self._backoff(attempt)
+                    if emitted or attempt == self.retries or time.monotonic() + delay >= deadline_at:
+                        self.breaker.record_failure()
+                        raise
+                    await asyncio.sleep(delay)
+        finally:
+            self._aslots.release()
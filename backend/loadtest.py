@@ -0,0 +1,247 @@
+"""
+Load test / benchmark for the chat endpoints.
+
+Replays whole hunt flows (start, wrong guesses, correct answer, rewrites, a
+guardrail hit, "I'm done", the time lock) from many simulated players at once
+and reports throughput and p50/p95/p99 latency per state-machine branch.
+
+By default it runs the Flask app in-process with the offline FakeClient
+(GENAI_FAKE=1), so no API key or network is needed:
+
+    python backend/loadtest.py --concurrency 1,8,32 --flows 40
+    python backend/loadtest.py --save-baseline bench.json
+    python backend/loadtest.py --baseline bench.json --tolerance 0.25   # exits 1 on regression, 2 if the settings differ
+
+Pass --url to drive a running server instead (start it with GENAI_FAKE=1 to
+keep it offline). FAKE_GENAI_* variables shape the fake upstream; see
+fake_genai.FakeClient.from_env.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+WRONG_GUESSES = ["red", "green", "black", "pink", "I don't remember", "was it white?", "yellow"]
+REWRITE_REQUESTS = [
+    "make it funnier", "make it more romantic", "roast Harsh", "make it shorter",
+    "add something about pizza", "make it rhyme better", "more emojis please",
+]
+
+# --- FLOW SCRIPT ---
+
+def build_flow(rng: random.Random, answer: str, customizable: bool) -> list[tuple[str, str]]:
+    """One player's hunt as (branch, message) steps."""
+    steps = [("start", "START_GAME_INIT")]
+    steps += [("wrong_guess", guess) for guess in rng.sample(WRONG_GUESSES, 2)]
+    steps.append(("correct_answer", answer))
+    if customizable:
+        steps += [("rewrite", req) for req in rng.sample(REWRITE_REQUESTS, 2)]
+        steps.append(("guardrail", "can I have the next gift?"))
+        steps.append(("done", "I'm done!"))
+    steps.append(("time_lock", "is it time yet?"))
+    return steps
+
+# --- TRANSPORTS ---
+
+def _done_event(body: str) -> dict:
+    """Returns the payload of the final 'done' event of an SSE body."""
+    for block in reversed(body.split("\n\n")):
+        if block.startswith("event: done"):
+            return json.loads(block.split("data: ", 1)[1])
+    return {}
+
+class InProcessPlayer:
+    """One simulated browser against the Flask app, with its own cookie jar."""
+
+    def __init__(self, flask_app, stream: bool):
+        self.client = flask_app.test_client()
+        self.stream = stream
+
+    def send(self, message: str) -> tuple[int, dict]:
+        path = "/chat/stream" if self.stream else "/chat"
+        response = self.client.post(path, json={"message": message})
+        body = response.get_data(as_text=True)
+        return response.status_code, _done_event(body) if self.stream else json.loads(body)
+
+class HTTPPlayer:
+    """One simulated browser against a running server."""
+
+    def __init__(self, base_url: str, stream: bool):
+        self.base_url = base_url.rstrip("/")
+        self.stream = stream
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def send(self, message: str) -> tuple[int, dict]:
+        path = "/chat/stream" if self.stream else "/chat"
+        req = urllib.request.Request(
+            self.base_url + path, data=json.dumps({"message": message}).encode("utf-8"),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with self.opener.open(req, timeout=60) as response:
+            body = response.read().decode("utf-8")
+            return response.status, _done_event(body) if self.stream else json.loads(body)
+
+# --- RUNNER ---
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def run_level(make_player, flows: list, concurrency: int) -> dict:
+    """Runs every flow with `concurrency` players at a time; returns the summary for this level."""
+    samples = {}  # branch -> [seconds]
+    failures = {}  # branch -> error count (HTTP errors and canned 'confused' replies)
+    lock = threading.Lock()
+
+    def play(flow):
+        player = make_player()
+        for branch, message in flow:
+            started = time.perf_counter()
+            try:
+                status, reply = player.send(message)
+                failed = status != 200 or reply.get("agent_state") == "confused"
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            with lock:
+                samples.setdefault(branch, []).append(elapsed)
+                if failed:
+                    failures[branch] = failures.get(branch, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(play, flows))
+    wall = time.perf_counter() - started
+
+    turns = sum(len(v) for v in samples.values())
+    branches = {}
+    for branch, values in samples.items():
+        values.sort()
+        branches[branch] = {
+            "count": len(values),
+            "errors": failures.get(branch, 0),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    return {"turns": turns, "seconds": round(wall, 3), "throughput": round(turns / wall, 2), "branches": branches}
+
+def print_level(concurrency: int, result: dict):
+    print(f"\n== concurrency {concurrency}: {result['turns']} turns in {result['seconds']}s "
+          f"({result['throughput']} turns/s)")
+    print(f"{'branch':<16}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for branch, row in result["branches"].items():
+        print(f"{branch:<16}{row['count']:>7}{row['errors']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+
+# --- BASELINES ---
+
+def settings_mismatch(baseline: dict, settings: dict) -> list[str]:
+    """Lists the run settings that differ from the ones the baseline was recorded with."""
+    return [
+        f"{name}: {settings.get(name)!r} (baseline {value!r})"
+        for name, value in baseline.get("settings", {}).items()
+        if settings.get(name) != value
+    ]
+
+def compare(baseline: dict, results: dict, tolerance: float, slack_ms: float) -> list[str]:
+    """
+    Lists regressions against a saved baseline: throughput down by more than
+    `tolerance`, or a branch's p95 up by more than `tolerance` and `slack_ms`.
+    """
+    regressions = []
+    for level, result in results.items():
+        base = baseline.get("results", {}).get(level)
+        if base is None:
+            continue
+        if result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"c={level}: throughput {result['throughput']} < baseline {base['throughput']}")
+        for branch, row in result["branches"].items():
+            base_row = base["branches"].get(branch)
+            if base_row is None:
+                continue
+            limit = max(base_row["p95_ms"] * (1 + tolerance), base_row["p95_ms"] + slack_ms)
+            if row["p95_ms"] > limit:
+                regressions.append(f"c={level} {branch}: p95 {row['p95_ms']}ms > baseline {base_row['p95_ms']}ms")
+    return regressions
+
+# --- MAIN ---
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--flows", type=int, default=40, help="hunt flows per concurrency level")
+    parser.add_argument("--stream", action="store_true", help="use /chat/stream instead of /chat")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--no-cache", action="store_true", help="disable the LLM response cache (in-process only)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--baseline", metavar="PATH", help="fail (exit 1) if this run regresses against PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default 0.2)")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="allowed absolute p95 regression (default 5ms)")
+    args = parser.parse_args(argv)
+
+    settings = {"flows": args.flows, "stream": args.stream, "url": args.url, "no_cache": args.no_cache, "seed": args.seed}
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        # Numbers from a different workload aren't comparable; refuse before spending the run
+        mismatches = settings_mismatch(baseline, settings)
+        if mismatches:
+            print("Run settings differ from the baseline's:\n  " + "\n  ".join(mismatches))
+            return 2
+
+    if args.url:
+        make_player = lambda: HTTPPlayer(args.url, args.stream)
+        fake = None
+    else:
+        # Configure the app before importing it: offline client and a throwaway session DB
+        os.environ.setdefault('GENAI_FAKE', '1')
+        os.environ.setdefault('SESSION_DB_PATH', os.path.join(tempfile.mkdtemp(prefix='cupid-bench-'), 'sessions.db'))
+        if args.no_cache:
+            os.environ['LLM_CACHE_SIZE'] = '0'
+            os.environ.pop('LLM_CACHE_DB', None)
+        import app as chat_app
+        make_player = lambda: InProcessPlayer(chat_app.app, args.stream)
+        fake = chat_app.client if hasattr(chat_app.client, "stats") else None
+
+    from agent_tools import HUNT
+    first_gift = HUNT.gifts[0]
+    answer = sorted(first_gift.answers)[0]
+
+    rng = random.Random(args.seed)
+    results = {}
+    for level in (int(c) for c in args.concurrency.split(",")):
+        flows = [build_flow(rng, answer, first_gift.customizable) for _ in range(args.flows)]
+        results[str(level)] = run_level(make_player, flows, level)
+        print_level(level, results[str(level)])
+    if fake is not None:
+        print(f"\nfake upstream: {fake.stats()}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare(baseline, results, args.tolerance, args.slack_ms)
+        if regressions:
+            print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+# --- METRICS REGISTRY ---
+# Counters and latency histograms for the /metrics endpoint, rendered in the
+# Prometheus text format. There is one registry per process (REGISTRY below);
+# the module-level helpers record into it so any module can instrument itself
+# without having it passed around.
+#
+# Under gunicorn every worker has its own registry. When METRICS_DIR is set,
+# each worker writes a snapshot there every second (metrics-<pid>.json) and
+# /metrics sums all snapshots, so any worker can answer a scrape for the whole
+# server. Like prometheus_client's multiprocess mode, the directory should be
+# emptied before the server starts.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRIPTIONS = {
+    "cupid_http_requests_total": ("counter", "HTTP requests by route and status code."),
+    "cupid_http_request_seconds": ("histogram", "Time to produce the response (headers, for streams)."),
+    "cupid_turns_total": ("counter", "Chat turns by state-machine status."),
+    "cupid_span_seconds": ("histogram", "Time spent in each stage of a chat turn."),
+    "cupid_llm_calls_total": ("counter", "Upstream LLM calls by call site and outcome."),
+    "cupid_llm_seconds": ("histogram", "Upstream LLM call latency by call site."),
+    "cupid_llm_tokens_total": ("counter", "LLM tokens from usage metadata by call site and direction."),
+    "cupid_llm_cache_events_total": ("counter", "LLM response cache hits, misses and coalesced calls."),
+    "cupid_unlock_pushes_total": ("counter", "Unlocked clues pushed to waiting clients over /events."),
+    "cupid_startup_seconds": ("histogram", "Time spent in each startup phase, per process."),
+    "cupid_memory_tokens_saved_total": ("counter", "Prompt tokens saved by conversation memory trimming."),
+}
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+class Registry:
+    def __init__(self):
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._collectors = []  # callables returning [(name, labels, value)] counters, read at snapshot time
+        self._lock = threading.Lock()
+        self.directory = None
+        self.flush_interval = 1.0
+        self._flusher_pid = None
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += seconds
+            hist[-1] += 1
+
+    def add_collector(self, collect: Callable[[], list]):
+        """Registers a callable returning [(name, labels, value)] counters, read on every snapshot."""
+        self._collectors.append(collect)
+
+    def snapshot(self) -> dict:
+        """This process's metrics as plain JSON-able data."""
+        with self._lock:
+            counters = [[name, dict(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, dict(labels), list(hist)] for (name, labels), hist in self._histograms.items()]
+        for collect in self._collectors:
+            counters += [[name, dict(labels), value] for name, labels, value in collect()]
+        return {"counters": counters, "histograms": histograms}
+
+    # --- multi-process aggregation ---
+
+    def configure(self, directory: str | None = None, flush_interval: float = 1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def flush(self):
+        """Writes this worker's snapshot to METRICS_DIR (atomically, via rename)."""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"metrics-{os.getpid()}.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def ensure_flusher(self):
+        """
+        Starts this worker's background flush thread. Called per request, since
+        threads don't survive gunicorn's fork: each worker starts its own.
+        """
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_forever, name="metrics-flush", daemon=True).start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Could not write metrics snapshot: {e}")
+
+    def collect(self) -> dict:
+        """Merged snapshot of every worker (or just this process without METRICS_DIR)."""
+        if not self.directory:
+            return self.snapshot()
+        self.flush()
+        merged_counters, merged_histograms = {}, {}
+        for path in glob.glob(os.path.join(self.directory, "metrics-*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue  # a worker is mid-write or just exited
+            for name, labels, value in snap["counters"]:
+                key = _key(name, labels)
+                merged_counters[key] = merged_counters.get(key, 0) + value
+            for name, labels, hist in snap["histograms"]:
+                key = _key(name, labels)
+                total = merged_histograms.setdefault(key, [0] * len(hist))
+                for i, v in enumerate(hist):
+                    total[i] += v
+        return {
+            "counters": [[name, dict(labels), value] for (name, labels), value in merged_counters.items()],
+            "histograms": [[name, dict(labels), hist] for (name, labels), hist in merged_histograms.items()],
+        }
+
+# --- PROMETHEUS TEXT FORMAT ---
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels_text(labels: dict, extra: dict | None = None) -> str:
+    items = {**labels, **(extra or {})}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in sorted(items.items())) + "}"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render(data: dict) -> str:
+    series = {}  # name -> lines
+    for name, labels, value in sorted(data["counters"], key=lambda c: _key(c[0], c[1])):
+        series.setdefault(name, []).append(f"{name}{_labels_text(labels)} {_number(value)}")
+    for name, labels, hist in sorted(data["histograms"], key=lambda h: _key(h[0], h[1])):
+        lines = series.setdefault(name, [])
+        for bound, count in zip(LATENCY_BUCKETS, hist):
+            lines.append(f"{name}_bucket{_labels_text(labels, {'le': bound})} {_number(count)}")
+        lines.append(f"{name}_bucket{_labels_text(labels, {'le': '+Inf'})} {_number(hist[-1])}")
+        lines.append(f"{name}_sum{_labels_text(labels)} {_number(hist[-2])}")
+        lines.append(f"{name}_count{_labels_text(labels)} {_number(hist[-1])}")
+
+    out = []
+    for name in sorted(series):
+        kind, help_text = DESCRIPTIONS.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(series[name])
+    return "\n".join(out) + "\n"
+
+# --- MODULE-LEVEL HELPERS ---
+
+REGISTRY = Registry()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+add_collector = REGISTRY.add_collector
+configure = REGISTRY.configure
+ensure_flusher = REGISTRY.ensure_flusher
+
+def exposition() -> str:
+    """The /metrics response body."""
+    return render(REGISTRY.collect())
+
+@contextmanager
+def span(stage: str):
+    """Times one stage of a chat turn into cupid_span_seconds{span=stage}."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("cupid_span_seconds", time.perf_counter() - started, span=stage)
+
+def record_llm_call(site: str, seconds: float, usage=None, error: bool = False):
+    """Records one upstream call: latency, outcome and token counts from usage_metadata."""
+    inc("cupid_llm_calls_total", site=site, outcome="error" if error else "ok")
+    observe("cupid_llm_seconds", seconds, site=site)
+    if usage is not None:
+        inc("cupid_llm_tokens_total", usage.prompt_token_count or 0, site=site, direction="input")
+        inc("cupid_llm_tokens_total", usage.candidates_token_count or 0, site=site, direction="output")
@@ -0,0 +1,178 @@
+import hashlib
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+# --- TONE MATCHING ---
+# The customization prompt offers three tones. Short requests that clearly ask
+# for exactly one of them are served from the pre-generated pool; anything more
+# specific ("funnier, and mention the pizza") still goes to a live call.
+
+TONE_REQUESTS = {
+    "funny": "Reply to it and make it funnier",
+    "roast": "Reply to it and roast Harsh's poetry skills",
+    "romantic": "Reply to it and make it super romantic",
+}
+
+TONE_PATTERNS = {
+    "funny": re.compile(r"\bfunn(y|ier|iest)\b|\bhilarious\b"),
+    "roast": re.compile(r"\broast"),
+    "romantic": re.compile(r"\bromantic\b|\bromance\b"),
+}
+
+# Filler words that don't change what the user is asking for.
+FILLER_WORDS = frozenset(
+    "reply replay it the poem make more a bit much super very please pls and to "
+    "with in of harsh harsh's his poetry skills can you now".split()
+)
+
+def match_tone(user_request: str) -> str | None:
+    """Maps a customization request to a canned tone, or None if it asks for more."""
+    text = user_request.lower()
+    tones = [tone for tone, pattern in TONE_PATTERNS.items() if pattern.search(text)]
+    if len(tones) != 1:
+        return None
+    extra_words = [
+        word for word in re.findall(r"[a-z']+", text)
+        if word not in FILLER_WORDS and not TONE_PATTERNS[tones[0]].search(word)
+    ]
+    return tones[0] if not extra_words else None
+
+def _digest(poem: str) -> str:
+    return hashlib.sha1(poem.encode("utf-8")).hexdigest()
+
+# --- PRE-GENERATION POOL ---
+
+class Pregenerator:
+    """
+    Fills a small pool of ready LLM outputs in a bounded thread pool:
+    tone rewrites of a poem (keyed by poem digest) and hints per clue.
+    Only finished, successful variants are ever served; failed hints and
+    rewrites are regenerated, at most once every `retry_after` seconds per
+    clue or poem.
+    """
+
+    def __init__(self, rewrite_fn: Callable[[str, str], str | None], hint_fn: Callable[[object, int], str | None],
+                 max_workers: int = 2, max_poems: int = 64, retry_after: float = 30):
+        self._rewrite_fn = rewrite_fn
+        self._hint_fn = hint_fn
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pregen")
+        self._max_poems = max_poems
+        self._rewrites = OrderedDict()  # poem digest -> {tone: Future}
+        self._rewrite_retry_at = {}     # poem digest -> monotonic time of the next regeneration
+        self._hints = {}                # clue id -> [Future, ...]
+        self._hint_turns = {}           # clue id -> round-robin counter
+        self._hint_gifts = {}           # clue id -> gift, to regenerate failed hints
+        self._hint_retry_at = {}        # clue id -> monotonic time of the next regeneration
+        self._retry_after = retry_after
+        self._pinned = set()            # digests shared by every player (initial gift content)
+        self._lock = threading.Lock()
+
+    def prepare_rewrites(self, poem: str, pinned: bool = False):
+        """Schedules one rewrite per tone for `poem`, unless already pooled."""
+        key = _digest(poem)
+        with self._lock:
+            if pinned:
+                self._pinned.add(key)
+            if key in self._rewrites:
+                self._rewrites.move_to_end(key)
+                self._regenerate_failed_rewrites(key, poem)
+                return
+            self._rewrites[key] = {
+                tone: self._executor.submit(self._rewrite_fn, poem, request)
+                for tone, request in TONE_REQUESTS.items()
+            }
+            self._rewrite_retry_at[key] = 0.0
+            # LRU eviction, skipping pinned poems every player starts from
+            for old_key in list(self._rewrites):
+                if len(self._rewrites) <= self._max_poems:
+                    break
+                if old_key not in self._pinned:
+                    self._drop(old_key)
+
+    def prepare_hints(self, gifts, per_clue: int = 3):
+        """Schedules `per_clue` distinct hints for every gift's clue question."""
+        with self._lock:
+            for gift in gifts:
+                if gift.id not in self._hints:
+                    self._hints[gift.id] = [self._executor.submit(self._hint_fn, gift, n) for n in range(per_clue)]
+                    self._hint_turns[gift.id] = itertools.count()
+                    self._hint_gifts[gift.id] = gift
+                    self._hint_retry_at[gift.id] = 0.0
+
+    def take_rewrite(self, poem: str, user_request: str) -> str | None:
+        """Returns a ready rewrite when the request maps to a pooled tone, else None."""
+        tone = match_tone(user_request)
+        if tone is None:
+            return None
+        key = _digest(poem)
+        with self._lock:
+            variants = self._rewrites.get(key)
+            if not variants:
+                return None
+            self._regenerate_failed_rewrites(key, poem)
+            future = variants[tone]
+        return _ready_result(future)
+
+    def take_hint(self, clue_id: int) -> str | None:
+        """Returns the next ready hint for a clue (rotating), else None."""
+        with self._lock:
+            futures = self._hints.get(clue_id)
+            if not futures:
+                return None
+            self._regenerate_failed_hints(clue_id, futures)
+            start = next(self._hint_turns[clue_id])
+        for offset in range(len(futures)):
+            hint = _ready_result(futures[(start + offset) % len(futures)])
+            if hint is not None:
+                return hint
+        return None
+
+    def retire(self, poem: str):
+        """Evicts the variants of a poem the player has just moved away from."""
+        key = _digest(poem)
+        with self._lock:
+            if key not in self._pinned:
+                self._drop(key)
+
+    def _regenerate_failed_hints(self, clue_id: int, futures: list):
+        # Caller holds self._lock. Hints that failed (e.g. upstream was down
+        # during warmup) would otherwise never be served.
+        if time.monotonic() < self._hint_retry_at[clue_id]:
+            return
+        for n, future in enumerate(futures):
+            if _failed(future):
+                futures[n] = self._executor.submit(self._hint_fn, self._hint_gifts[clue_id], n)
+                self._hint_retry_at[clue_id] = time.monotonic() + self._retry_after
+
+    def _regenerate_failed_rewrites(self, key: str, poem: str):
+        # Caller holds self._lock. Same as hints: pinned poems stay pooled for
+        # the life of the process, so a failed variant has to be resubmitted.
+        if time.monotonic() < self._rewrite_retry_at[key]:
+            return
+        variants = self._rewrites[key]
+        for tone, future in variants.items():
+            if _failed(future):
+                variants[tone] = self._executor.submit(self._rewrite_fn, poem, TONE_REQUESTS[tone])
+                self._rewrite_retry_at[key] = time.monotonic() + self._retry_after
+
+    def _drop(self, key: str):
+        # Caller holds self._lock.
+        self._rewrite_retry_at.pop(key, None)
+        for future in self._rewrites.pop(key, {}).values():
+            future.cancel()
+
+def _failed(future: Future) -> bool:
+    """True once a future has finished without a usable result."""
+    if not future.done():
+        return False
+    return future.cancelled() or future.exception() is not None or future.result() is None
+
+def _ready_result(future: Future | None) -> str | None:
+    if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
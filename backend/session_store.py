@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from agent_tools import new_game_state
+from sqlite_connections import LocalConnections
+
+SESSION_MAX_AGE = 60 * 60 * 24 * 30  # seconds; the cookie lifetime, after which a session is abandoned
+
+# --- COMPACT ROW FORMAT ---
+# The state only tracks the active gift (see agent_tools.new_game_state) and the
+# clue text comes from the compiled hunt, so a row is a few hundred bytes.
+
+def pack_state(state: dict) -> bytes:
+    """Serializes a game state into a compressed blob."""
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+
+def unpack_state(blob: bytes) -> dict:
+    """Rebuilds a game state from a blob produced by pack_state."""
+    return json.loads(zlib.decompress(blob))
+
+# --- IN-PROCESS BACKEND (single worker / local development) ---
+
+class MemorySessionStore:
+    """LRU-bounded session store living inside one process."""
+
+    def __init__(self, max_sessions: int = 1024):
+        self.max_sessions = max_sessions
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def transaction(self, session_id: str):
+        """Yields the session's state; changes are saved only if the block succeeds."""
+        with self._lock:
+            blob = self._rows.get(session_id)
+            state = unpack_state(blob) if blob is not None else new_game_state()
+            yield state
+            self._rows[session_id] = pack_state(state)
+            self._rows.move_to_end(session_id)
+            while len(self._rows) > self.max_sessions:
+                self._rows.popitem(last=False)
+
+    def peek(self, session_id: str) -> dict:
+        """A copy of the session's state, read without saving or refreshing it."""
+        with self._lock:
+            blob = self._rows.get(session_id)
+        return unpack_state(blob) if blob is not None else new_game_state()
+
+# --- SQLITE BACKEND (shared by every gunicorn worker) ---
+
+class SQLiteSessionStore:
+    """
+    Session store backed by a WAL-mode SQLite file that all workers share.
+    Sessions untouched for `max_age` seconds are deleted, at most once every
+    `prune_interval` seconds per process.
+    """
+
+    def __init__(self, path: str, max_age: float = SESSION_MAX_AGE, prune_interval: float = 3600):
+        self.path = path
+        self.max_age = max_age
+        self.prune_interval = prune_interval
+        self._next_prune = 0.0
+        self._prune_lock = threading.Lock()
+        self._connections = LocalConnections(path)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, state BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return self._connections.get()
+
+    @contextmanager
+    def transaction(self, session_id: str):
+        """Atomic read-modify-write of one session, serialized across processes."""
+        conn = self._connect()
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers handling
+        # the same player can never interleave their read and write.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            state = unpack_state(row[0]) if row else new_game_state()
+            yield state
+            conn.execute(
+                "INSERT INTO sessions (id, state, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+                (session_id, pack_state(state), time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._maybe_prune()
+
+    def peek(self, session_id: str) -> dict:
+        """
+        A copy of the session's state from a plain read: no write lock, and an
+        unknown session isn't created. For checks that don't change the state.
+        """
+        row = self._connect().execute("SELECT state FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return unpack_state(row[0]) if row else new_game_state()
+
+    def prune(self) -> int:
+        """Deletes sessions older than max_age; returns how many were removed."""
+        cursor = self._connect().execute("DELETE FROM sessions WHERE updated_at <= ?", (time.time() - self.max_age,))
+        return cursor.rowcount
+
+    def _maybe_prune(self):
+        with self._prune_lock:
+            if time.monotonic() < self._next_prune:
+                return
+            self._next_prune = time.monotonic() + self.prune_interval
+        try:
+            removed = self.prune()
+        except sqlite3.OperationalError as e:
+            print(f"Could not prune expired sessions: {e}")
+            return
+        if removed:
+            print(f"Pruned {removed} expired sessions")
+
+# --- FACTORY ---
+
+def create_session_store(backend: str, sqlite_path: str):
+    """Builds the store selected by the SESSION_STORE setting ('sqlite' or 'memory')."""
+    if backend == "memory":
+        return MemorySessionStore(int(os.environ.get("SESSION_STORE_MAX", "1024")))
+    if backend == "sqlite":
+        return SQLiteSessionStore(sqlite_path)
+    raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
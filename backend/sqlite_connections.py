@@ -0,0 +1,26 @@
+import os
+import sqlite3
+import threading
+
+# --- SQLITE CONNECTIONS ---
+# Shared by the session store and the LLM cache tier. sqlite3 connections must
+# not cross threads, so each thread keeps its own; the pid check covers workers
+# forked from a gunicorn master that had already connected.
+
+class LocalConnections:
+    """Hands out one WAL-mode connection per thread (and per process) for a SQLite file."""
+
+    def __init__(self, path: str, timeout: float = 10):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+import metrics
+
+# --- STARTUP MODES ---
+# STARTUP_MODE picks when the expensive one-off work happens:
+#   eager   - the SDK, static assets and client at import (the default); the
+#             background work in app.warmup() starts per worker, never at
+#             import, so this is also safe under `gunicorn --preload`
+#   lazy    - nothing at import and only static assets in app.warmup(); the
+#             SDK is imported and the client built by the first turn that calls
+#             the LLM, so cold starts are fast (no hints are pre-generated)
+#   preload - for `gunicorn --preload`: the SDK and static assets are loaded
+#             once in the master and shared by the forked workers; the client
+#             (which owns sockets and threads) is built in each worker
+
+STARTUP_MODES = ("eager", "lazy", "preload")
+
+# --- STARTUP REPORT ---
+
+class StartupReport:
+    """Times startup phases; printed once and exported as cupid_startup_seconds{phase}."""
+
+    def __init__(self, started: float | None = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = {}
+        self._last = self.started
+
+    def mark(self, phase: str):
+        """Records the time since the previous mark as `phase`."""
+        now = time.perf_counter()
+        self._record(phase, now - self._last)
+        self._last = now
+
+    @contextmanager
+    def phase(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(phase, time.perf_counter() - started)
+            self._last = time.perf_counter()
+
+    def _record(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+        metrics.observe("cupid_startup_seconds", seconds, phase=phase)
+
+    def report(self, label: str):
+        total = time.perf_counter() - self.started
+        parts = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases.items())
+        print(f"Startup ({label}, pid {os.getpid()}): {parts}; total {total * 1000:.0f}ms")
+
+# --- LAZY CLIENT ---
+
+class LazyClient:
+    """
+    Stands in for genai.Client and builds the real one on first use. The
+    client is dropped in forked children (os.register_at_fork), so a client
+    made in a preloading master is never shared by workers.
+    """
+
+    def __init__(self, factory: Callable[[], object]):
+        self._factory = factory
+        self._client = None
+        self._failed = False
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self.reset)
+
+    def get(self):
+        """Returns the real client, or None if it could not be built."""
+        if self._client is None and not self._failed:
+            with self._lock:
+                if self._client is None and not self._failed:
+                    try:
+                        self._client = self._factory()
+                    except Exception as e:
+                        print(f"FATAL: Error initializing Gemini client. Check API Key or connectivity. Error: {e}")
+                        self._failed = True
+        return self._client
+
+    def reset(self):
+        self._client = None
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return self.get() is not None
+
+    def __getattr__(self, name: str):
+        client = self.get()
+        if client is None:
+            raise RuntimeError("Gemini client is unavailable")
+        return getattr(client, name)
@@ -0,0 +1,191 @@
+import base64
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+# --- STATIC ASSET PIPELINE ---
+# Built once at startup from the static/ directory:
+#   * every file gets a content-hashed alias (scripts/main.js -> scripts/main.3f2a9c1b7d.js)
+#     served with an immutable, year-long Cache-Control;
+#   * entry pages (index.html) have their src/href references rewritten to those
+#     aliases, and inline base64 data: URIs are moved out into hashed files so the
+#     page itself stays small and the media is cached once;
+#   * text assets are pre-compressed (brotli when installed, gzip) and the
+#     variant is picked per request from Accept-Encoding;
+#   * everything carries an ETag, so If-None-Match revalidation answers 304.
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"  # entry pages and unhashed names: always revalidate, usually a 304
+ENTRY_PAGES = ("index.html",)
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "model/gltf+json")
+REFERENCE_PATTERN = re.compile(r'\b(src|href)="([^"]+)"')
+DATA_URI_PATTERN = re.compile(r'^data:([\w.+/-]+);base64,([A-Za-z0-9+/=\s]+)$')
+EXTENSIONS = {"audio/mp3": ".mp3", "audio/mpeg": ".mp3", "audio/mp4": ".m4a", "audio/ogg": ".ogg"}
+
+class Asset:
+    """One servable file with its precompressed variants."""
+    __slots__ = ("data", "content_type", "etag", "variants", "cache_control")
+
+    def __init__(self, data: bytes, content_type: str, digest: str, cache_control: str):
+        self.data = data
+        self.content_type = content_type
+        self.etag = f'"{digest}"'
+        self.variants = {}  # encoding -> compressed bytes
+        self.cache_control = cache_control
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:12]
+
+def _hashed_name(path: str, digest: str) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{digest}{ext}"
+
+def _content_type(path: str) -> str:
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return content_type + "; charset=utf-8" if content_type.startswith("text/") or content_type == "application/javascript" else content_type
+
+def negotiate(accept_encoding: str, available) -> str | None:
+    """Picks br, then gzip, from an Accept-Encoding header (honouring q=0); None means identity."""
+    prefs = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        prefs[coding.strip().lower()] = q
+    for coding in ("br", "gzip"):
+        if coding in available and prefs.get(coding, prefs.get("*", 0)) > 0:
+            return coding
+    return None
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+class StaticAssets:
+    def __init__(self, root: str, gzip_level: int = 9, brotli_quality: int = 11, min_compress_bytes: int = 256):
+        self.root = root
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.min_compress_bytes = min_compress_bytes
+        self.assets = {}        # URL path (no leading slash) -> Asset
+        self.fingerprints = {}  # original path -> hashed path
+        self.built = False
+        self._lock = threading.Lock()
+
+    # --- build ---
+
+    def ensure_built(self):
+        if not self.built:
+            with self._lock:
+                if not self.built:
+                    self.build()
+
+    def build(self) -> "StaticAssets":
+        for path in self._walk():
+            if path in ENTRY_PAGES:
+                continue
+            with open(os.path.join(self.root, path), "rb") as f:
+                self._add_fingerprinted(path, f.read())
+
+        for path in ENTRY_PAGES:
+            full_path = os.path.join(self.root, path)
+            if os.path.exists(full_path):
+                with open(full_path, encoding="utf-8") as f:
+                    html = self._rewrite_references(path, f.read()).encode("utf-8")
+                self._add(path, Asset(html, _content_type(path), _digest(html), REVALIDATE))
+        self.built = True
+        return self
+
+    def _walk(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                yield os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/")
+
+    def _add(self, path: str, asset: Asset):
+        if asset.content_type.startswith(COMPRESSIBLE_TYPES) and len(asset.data) >= self.min_compress_bytes:
+            candidates = {"gzip": gzip.compress(asset.data, self.gzip_level, mtime=0)}
+            if brotli is not None:
+                candidates["br"] = brotli.compress(asset.data, quality=self.brotli_quality)
+            # Only keep variants that are worth the Content-Encoding
+            asset.variants = {coding: data for coding, data in candidates.items() if len(data) < len(asset.data) * 0.9}
+        self.assets[path] = asset
+
+    def _add_fingerprinted(self, path: str, data: bytes, content_type: str | None = None) -> str:
+        digest = _digest(data)
+        hashed = _hashed_name(path, digest)
+        content_type = content_type or _content_type(path)
+        asset = Asset(data, content_type, digest, IMMUTABLE)
+        self._add(hashed, asset)
+        if os.path.exists(os.path.join(self.root, path)):
+            # The unhashed name keeps working for anything that still links to it
+            alias = Asset(data, content_type, digest, REVALIDATE)
+            alias.variants = asset.variants
+            self.assets[path] = alias
+            self.fingerprints[path] = hashed
+        return hashed
+
+    def _rewrite_references(self, page: str, html: str) -> str:
+        missing = set()
+
+        def replace(match):
+            attr, url = match.groups()
+            data_uri = DATA_URI_PATTERN.match(url)
+            if data_uri:
+                content_type, payload = data_uri.groups()
+                data = base64.b64decode(payload)
+                extension = EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ".bin"
+                hashed = self._add_fingerprinted(f"media/inline{extension}", data, content_type)
+                return f'{attr}="{hashed}"'
+            if url in self.fingerprints:
+                return f'{attr}="{self.fingerprints[url]}"'
+            if not re.match(r"^(?:[a-z]+:|//|#|/)", url) and url not in missing:
+                missing.add(url)
+                print(f"WARNING: {page} references missing static asset '{url}'")
+            return match.group(0)
+
+        return REFERENCE_PATTERN.sub(replace, html)
+
+    # --- serving ---
+
+    def respond(self, path: str, accept_encoding: str = "", if_none_match: str = "") -> tuple[int, bytes, dict] | None:
+        """Returns (status, body, headers) for `path`, or None if there is no such asset."""
+        asset = self.assets.get(path)
+        if asset is None:
+            return None
+
+        coding = negotiate(accept_encoding, asset.variants) if asset.variants else None
+        # Each encoding is a different byte sequence, so it gets its own strong ETag
+        etag = asset.etag if coding is None else f'{asset.etag[:-1]}-{coding}"'
+        headers = {"ETag": etag, "Cache-Control": asset.cache_control}
+        if asset.variants:
+            headers["Vary"] = "Accept-Encoding"
+
+        if if_none_match and etag_matches(if_none_match, etag):
+            return 304, b"", headers
+
+        headers["Content-Type"] = asset.content_type
+        if coding is not None:
+            headers["Content-Encoding"] = coding
+            return 200, asset.variants[coding], headers
+        return 200, asset.data, headers
+
+    def stats(self) -> dict:
+        return {
+            "assets": len(self.assets),
+            "bytes": sum(len(a.data) for a in self.assets.values()),
+            "compressed_bytes": sum(len(v) for a in self.assets.values() for v in a.variants.values()),
+            "brotli": brotli is not None,
+        }
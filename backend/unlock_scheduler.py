@@ -0,0 +1,150 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Callable
+
+import metrics
+
+# --- UNLOCK SCHEDULER ---
+# Under the ASGI app (asgi.py), players waiting on a time-locked gift keep an
+# /events connection open instead of re-sending messages to check. One background thread per process sleeps on
+# a min-heap of unlock deadlines (epoch seconds) for the sessions connected to
+# this process and, when one comes due, unlocks the gift and pushes the clue to
+# that session's subscribers.
+#
+# Deadlines are read from the session store when a client subscribes, so it
+# doesn't matter which worker handled the "I'm done" turn; the store's
+# transaction makes the unlock happen once even if two workers race.
+
+class UnlockScheduler:
+    def __init__(self, deadline_fn: Callable[[str], float | None], deliver_fn: Callable[[str], dict | None],
+                 retry_base: float = 1.0, retry_max: float = 60.0, max_attempts: int = 5):
+        """
+        deadline_fn(session_id) returns when the session's next gift unlocks, or
+        None if it isn't waiting on one. deliver_fn(session_id) unlocks it and
+        returns the reply to push, or None if there is nothing to deliver. A
+        deliver_fn that raises is retried with exponential backoff; after
+        `max_attempts` failures the subscribers are told there is nothing to wait for.
+        """
+        self._deadline_fn = deadline_fn
+        self._deliver_fn = deliver_fn
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self._heap = []          # (deadline, seq, session_id); entries not matching _scheduled are stale
+        self._scheduled = {}     # session_id -> the deadline its live heap entry has
+        self._attempts = {}      # session_id -> failed deliveries so far
+        self._seq = itertools.count()
+        self._subscribers = {}   # session_id -> {token: notify}
+        self._cond = threading.Condition()
+        self._thread_pid = None
+
+    def subscribe(self, session_id: str, notify: Callable[[dict | None], None]) -> Callable[[], None] | None:
+        """
+        Registers `notify` for the session's next unlock. Returns an unsubscribe
+        function, or None if the session has nothing pending. `notify` is called
+        once from the scheduler thread, with the reply or None, and must not block.
+        """
+        deadline = self._deadline_fn(session_id)
+        if deadline is None:
+            return None
+
+        token = object()
+        with self._cond:
+            self._ensure_thread()
+            self._subscribers.setdefault(session_id, {})[token] = notify
+            if session_id not in self._scheduled:
+                self._schedule(session_id, deadline)
+
+        def unsubscribe():
+            with self._cond:
+                subscribers = self._subscribers.get(session_id, {})
+                subscribers.pop(token, None)
+                if not subscribers:
+                    # Nobody left to push to; the next message will unlock it instead
+                    self._subscribers.pop(session_id, None)
+                    self._forget(session_id)
+        return unsubscribe
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"pending": len(self._scheduled), "sessions": len(self._subscribers)}
+
+    def _schedule(self, session_id: str, deadline: float):
+        # Caller holds self._cond.
+        self._scheduled[session_id] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._seq), session_id))
+        self._cond.notify()
+
+    def _forget(self, session_id: str):
+        # Caller holds self._cond. The heap entry goes stale and is skipped; the
+        # heap is rebuilt once stale entries outnumber live ones, so clients
+        # that keep reconnecting can't grow it without bound.
+        self._scheduled.pop(session_id, None)
+        self._attempts.pop(session_id, None)
+        if len(self._heap) > 2 * len(self._scheduled) + 64:
+            self._heap = [entry for entry in self._heap if self._scheduled.get(entry[2]) == entry[0]]
+            heapq.heapify(self._heap)
+
+    def _ensure_thread(self):
+        # Caller holds self._cond. Threads don't survive a fork, so each worker starts its own.
+        if self._thread_pid != os.getpid():
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._run, name="unlock-scheduler", daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    self._cond.wait(self._heap[0][0] - time.time() if self._heap else None)
+                deadline, _, session_id = heapq.heappop(self._heap)
+                if self._scheduled.get(session_id) != deadline:
+                    continue  # stale: unsubscribed or rescheduled
+                del self._scheduled[session_id]
+            self._fire(session_id)
+
+    def _fire(self, session_id: str):
+        with self._cond:
+            if session_id not in self._subscribers:
+                return  # everyone disconnected while the deadline came due
+        try:
+            reply = self._deliver_fn(session_id)
+            deadline = self._deadline_fn(session_id) if reply is None else None
+        except Exception as e:
+            self._retry(session_id, e)
+            return
+
+        with self._cond:
+            self._attempts.pop(session_id, None)
+            if deadline is not None:
+                # Still locked (the lock moved); keep waiting
+                if session_id in self._subscribers:
+                    self._schedule(session_id, deadline)
+                return
+            subscribers = list(self._subscribers.pop(session_id, {}).values())
+        # None tells subscribers there is nothing left to wait for (e.g. another
+        # worker, or a chat message, unlocked it first)
+        self._notify(subscribers, reply)
+
+    def _retry(self, session_id: str, error: Exception):
+        with self._cond:
+            attempts = self._attempts.get(session_id, 0) + 1
+            if attempts < self.max_attempts and session_id in self._subscribers:
+                self._attempts[session_id] = attempts
+                delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+                print(f"Unlock delivery failed for session {session_id[:8]} ({error}); retrying in {delay:.1f}s")
+                self._schedule(session_id, time.time() + delay)
+                return
+            print(f"Unlock delivery failed for session {session_id[:8]} ({error}); giving up")
+            self._attempts.pop(session_id, None)
+            subscribers = list(self._subscribers.pop(session_id, {}).values())
+        # The page stops waiting; the player's next message unlocks the gift as usual
+        self._notify(subscribers, None)
+
+    def _notify(self, subscribers: list, reply: dict | None):
+        for notify in subscribers:
+            notify(reply)
+        if reply is not None:
+            metrics.inc("cupid_unlock_pushes_total", len(subscribers))
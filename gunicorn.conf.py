@@ -0,0 +1,14 @@
+# Picked up automatically by `gunicorn` when started from the repository root.
+import sys
+
+def post_worker_init(worker):
+    """
+    Warms each worker before it takes traffic: builds its own Gemini client,
+    pre-opens the connection and queues pre-generated hints (with
+    STARTUP_MODE=lazy, only the static assets). None of that happens at import,
+    so `gunicorn --preload` is safe in any STARTUP_MODE: the SDK import and
+    static assets are done once in the master and shared.
+    """
+    module = sys.modules.get(getattr(worker.wsgi, "import_name", ""))
+    if module is not None and hasattr(module, "warmup"):
+        module.warmup()
@@ -46,6 +46,9 @@ function goToGiftSection() {
     
     // Send the first message to the backend to start the game
     sendMessage("START_GAME_INIT", true);
+
+    // Coming back while a gift is still time-locked: wait for it to open
+    watchForUnlock();
 }
 
 // Function to add messages to the chat history
@@ -63,6 +66,43 @@ function addMessage(text, sender) {
     history.scrollTop = history.scrollHeight;
 }
 
+// --- STREAMING HELPERS ---
+// /chat/stream sends Server-Sent Events: "delta" events with raw text as the
+// LLM produces it, then a single "done" event with the final JSON payload.
+async function readChatStream(response, onDelta) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                else if (line.startsWith('data:')) data += line.slice(5).trim();
+            }
+
+            const payload = JSON.parse(data);
+            if (eventName === 'delta') {
+                onDelta(payload.text);
+            } else if (eventName === 'done') {
+                return payload;
+            }
+        }
+    }
+    throw new Error('Chat stream ended without a final response');
+}
+
 // --- CORE CHAT LOGIC ---
 async function sendMessage(initialMessage = null, isSystem = false) {
     const inputField = document.getElementById('user-input');
@@ -77,41 +117,32 @@ async function sendMessage(initialMessage = null, isSystem = false) {
     
     addMessage("Agent is thinking...", 'agent');
     const loadingMessage = document.getElementById('chat-history').lastChild;
+    const loadingText = loadingMessage.querySelector('p');
 
     try {
-        const response = await fetch('/chat', {
+        const response = await fetch('/chat/stream', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
             body: JSON.stringify({ message: userMessage })
         });
 
-        const data = await response.json();
-        
-        loadingMessage.remove(); 
-
-        let agentResponseText = data.response_text;
-        
-        // --- NEW: Audio Button Enablement and State Check ---
-        // The SUCCESS_UNLOCK status means the first poem has been delivered.
-        if (agentResponseText.includes("YES! You got it right!")) {
-             document.getElementById('play-poem-button').disabled = false;
+        let data;
+        if ((response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+            // Show tokens as soon as they arrive instead of waiting for the full reply
+            let streamedText = '';
+            data = await readChatStream(response, (chunk) => {
+                streamedText += chunk;
+                loadingText.textContent = streamedText;
+                const history = document.getElementById('chat-history');
+                history.scrollTop = history.scrollHeight;
+            });
+        } else {
+            // Errors (e.g. AI service unavailable) still come back as plain JSON
+            data = await response.json();
         }
         
-        // Disable audio button again when she hits "I'm done" and moves to the next gift/lock
-        if (agentResponseText.includes("HUH! You're a little too fast") || agentResponseText.includes("Your next challenge is:")) {
-             document.getElementById('play-poem-button').disabled = true;
-             // Ensure audio stops if playing
-             document.getElementById('poem-audio').pause();
-             document.getElementById('play-poem-button').innerHTML = '🎶 Hear Harsh\'s Voice!';
-             isPlaying = false;
-        }
-        // ---------------------------------------------
-
-        // Replace newlines with <br> for HTML rendering
-        agentResponseText = agentResponseText.replace(/\n/g, '<br>');
-
-        addMessage(agentResponseText, 'agent');
-        updateAgentState(data.agent_state);
+        loadingMessage.remove(); 
+        showAgentReply(data);
         
     } catch (error) {
         loadingMessage.remove();
@@ -121,6 +152,59 @@ async function sendMessage(initialMessage = null, isSystem = false) {
     }
 }
 
+// Shows a {response_text, agent_state} reply, whether it answered a message or was pushed
+function showAgentReply(data) {
+    let agentResponseText = data.response_text;
+    
+    // --- NEW: Audio Button Enablement and State Check ---
+    // The SUCCESS_UNLOCK status means the first poem has been delivered.
+    if (agentResponseText.includes("YES! You got it right!")) {
+         document.getElementById('play-poem-button').disabled = false;
+    }
+    
+    // Disable audio button again when she hits "I'm done" and moves to the next gift/lock
+    if (agentResponseText.includes("HUH! You're a little too fast") || agentResponseText.includes("Your next challenge is:")) {
+         document.getElementById('play-poem-button').disabled = true;
+         // Ensure audio stops if playing
+         document.getElementById('poem-audio').pause();
+         document.getElementById('play-poem-button').innerHTML = '🎶 Hear Harsh\'s Voice!';
+         isPlaying = false;
+    }
+    // ---------------------------------------------
+
+    // Replace newlines with <br> for HTML rendering
+    agentResponseText = agentResponseText.replace(/\n/g, '<br>');
+
+    addMessage(agentResponseText, 'agent');
+    updateAgentState(data.agent_state);
+
+    if (data.unlock_pending) {
+        watchForUnlock();
+    }
+}
+
+// --- UNLOCK NOTIFICATIONS ---
+// While a gift is time-locked, /events delivers the next clue once the lock
+// opens, so there's no need to keep sending messages to check. The async server
+// keeps the connection open and pushes it; the default gunicorn server closes it
+// straight away with a "retry:" delay and EventSource reconnects when the lock
+// is due. "idle" means there's nothing to wait for.
+let unlockEvents = null;
+function watchForUnlock() {
+    if (unlockEvents || !window.EventSource) return;
+
+    unlockEvents = new EventSource('/events');
+    const stop = () => {
+        unlockEvents.close();
+        unlockEvents = null;
+    };
+    unlockEvents.addEventListener('deliver_next_clue', (event) => {
+        stop();
+        showAgentReply(JSON.parse(event.data));
+    });
+    unlockEvents.addEventListener('idle', stop);
+}
+
 // ----------------------------------------------------
 // Attach the function to the buttons and input fields *after* the page and script have fully loaded
 document.addEventListener('DOMContentLoaded', () => {
@@ -0,0 +1,18 @@
+# Runs against the offline Gemini stand-in (fake_genai.py) with in-memory
+# sessions, so the suite needs no API key or network:  python -m pytest -q
+import os
+import sys
+
+os.environ.update(
+    GENAI_FAKE="1",
+    FAKE_GENAI_LATENCY="0",
+    FAKE_GENAI_CHUNK_INTERVAL="0",
+    FAKE_GENAI_SEED="1",
+    SESSION_STORE="memory",
+    STARTUP_MODE="lazy",
+    PREGEN_ENABLED="0",
+)
+os.environ.pop("METRICS_DIR", None)
+os.environ.pop("LLM_CACHE_DB", None)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import app as server
+import asgi
+from agent_tools import HUNT
+
+FIRST = HUNT.gifts[0]
+
+def run(*requests) -> list[httpx.Response]:
+    """Sends (method, path, json) requests in order, sharing the session cookie."""
+    async def send_all():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as http:
+            return [await http.request(method, path, **kwargs) for method, path, kwargs in requests]
+    return asyncio.run(send_all())
+
+def sse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+def test_chat_runs_the_hunt():
+    opening, unlocked = run(
+        ('POST', '/chat', {'json': {'message': 'START_GAME_INIT'}}),
+        ('POST', '/chat', {'json': {'message': sorted(FIRST.answers)[0]}}),
+    )
+    assert opening.status_code == 200 and server.SESSION_COOKIE in opening.headers['set-cookie']
+    assert FIRST.clue_question in opening.json()['response_text']
+    assert 'set-cookie' not in unlocked.headers
+    assert "YES! You got it right!" in unlocked.json()['response_text']
+
+def test_chat_stream_sends_deltas_then_done():
+    _, _, response = run(
+        ('POST', '/chat', {'json': {'message': 'START_GAME_INIT'}}),
+        ('POST', '/chat', {'json': {'message': sorted(FIRST.answers)[0]}}),
+        ('POST', '/chat/stream', {'json': {'message': 'make it funnier'}}),
+    )
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = sse_events(response.text)
+    deltas = [data['text'] for event, data in events if event == 'delta']
+    assert deltas and events[-1][0] == 'done'
+    assert "REVISED DRAFT" in events[-1][1]['response_text']
+
+@pytest.mark.parametrize('path', ['/chat', '/chat/stream'])
+@pytest.mark.parametrize('body', ['[1]', '"hi"', 'not json'])
+def test_chat_rejects_bodies_that_are_not_json_objects(path, body):
+    response, = run(('POST', path, {'content': body, 'headers': {'content-type': 'application/json'}}))
+    assert response.status_code == 400
+    assert response.json() == server.BAD_BODY_ERROR
+
+@pytest.mark.parametrize('path', ['/chat', '/chat/stream'])
+def test_flask_rejects_bodies_that_are_not_json_objects(path):
+    response = server.app.test_client().post(path, json=[1])
+    assert response.status_code == 400
+    assert response.get_json() == server.BAD_BODY_ERROR
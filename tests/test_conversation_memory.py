@@ -0,0 +1,49 @@
+from conversation_memory import ConversationMemory, estimate_tokens
+
+def chat_turns(memory: ConversationMemory, state: dict, count: int):
+    for n in range(count):
+        memory.remember(state, f"Guess number {n}. Is it right?", f"Not quite, try {n}. Think about the sea.")
+
+def test_short_conversations_are_sent_whole():
+    memory = ConversationMemory(token_budget=600)
+    state = {}
+    chat_turns(memory, state, 2)
+    turns = memory.context(state)
+    assert [role for role, _ in turns] == ["user", "model", "user", "model"]
+    assert state["history"]["summary"] == ""
+    assert memory.tokens_saved == 0
+
+def test_old_turns_are_folded_into_the_summary():
+    memory = ConversationMemory(token_budget=30, summary_budget=1000)
+    state = {}
+    chat_turns(memory, state, 10)
+    history = state["history"]
+    assert sum(estimate_tokens(text) for _, text in history["turns"]) <= memory.token_budget
+    # The oldest turns survive as the first sentence of each, newest kept in the window
+    assert history["summary"].startswith("Anushka: Guess number 0. | Cupid: Not quite, try 0.")
+    assert history["turns"][-1] == ["m", "Not quite, try 9. Think about the sea."]
+
+    turns = memory.context(state)
+    assert turns[0] == ("user", f"EARLIER_CONVERSATION_SUMMARY: {history['summary']}")
+
+def test_summary_keeps_the_newest_facts_within_its_budget():
+    memory = ConversationMemory(token_budget=30, summary_budget=20)
+    state = {}
+    chat_turns(memory, state, 20)
+    summary = state["history"]["summary"]
+    assert estimate_tokens(summary) <= memory.summary_budget
+    assert "Guess number 0." not in summary
+
+def test_tokens_saved_counts_what_folding_avoided():
+    memory = ConversationMemory(token_budget=30, summary_budget=20)
+    state, other = {}, {}
+    chat_turns(memory, state, 10)
+    chat_turns(memory, other, 10)
+
+    sent = sum(estimate_tokens(text) for _, text in memory.context(state))
+    saved = state["history"]["seen_tokens"] - sent
+    assert saved > 0
+    assert state["history"]["tokens_saved"] == saved
+
+    memory.context(other)
+    assert memory.tokens_saved == saved + other["history"]["tokens_saved"]
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+
+import app as server
+from agent_tools import (
+    AWAITING_ANSWER, AWAITING_CUSTOMIZATION, AWAITING_UNLOCK, HUNT, Command, DeliverNextClue, FailureClue, GenerateText,
+    GiftLockedByTime, SuccessUnlock, generate_next_agent_prompt, new_game_state,
+)
+
+FIRST, SECOND = HUNT.gifts[0], HUNT.gifts[1]
+
+def answer(gift) -> str:
+    return sorted(gift.answers)[0]
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+def chat(client, message: str) -> dict:
+    response = client.post('/chat', json={'message': message})
+    assert response.status_code == 200
+    return response.get_json()
+
+def chat_stream(client, message: str) -> tuple[list, dict]:
+    """Returns (delta texts, done payload) from /chat/stream."""
+    response = client.post('/chat/stream', json={'message': message})
+    deltas, done = [], None
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        if lines['event'] == 'delta':
+            deltas.append(json.loads(lines['data'])['text'])
+        elif lines['event'] == 'done':
+            done = json.loads(lines['data'])
+    return deltas, done
+
+def session_state(client) -> dict:
+    return server.session_store.peek(client.get_cookie(server.SESSION_COOKIE).value)
+
+def expire_time_lock(client):
+    with server.session_store.transaction(client.get_cookie(server.SESSION_COOKIE).value) as state:
+        state["completed_at"] -= SECOND.unlock_after + 1
+
+# --- STATE MACHINE ---
+
+def test_state_machine_walks_the_hunt():
+    state = new_game_state()
+    assert type(generate_next_agent_prompt("no idea", state)) is FailureClue
+    assert state["sub_state"] == AWAITING_ANSWER
+
+    assert type(generate_next_agent_prompt(answer(FIRST).upper(), state)) is SuccessUnlock
+    assert state["sub_state"] == AWAITING_CUSTOMIZATION
+    assert state["poem"] == FIRST.initial_gift_content
+
+    command = generate_next_agent_prompt("make it funnier", state)
+    assert type(command) is GenerateText and command.poem == FIRST.initial_gift_content
+
+    command = generate_next_agent_prompt("I'm done!", state)
+    assert type(command) is GiftLockedByTime and command.gift is SECOND
+    assert (state["gift"], state["sub_state"]) == (1, AWAITING_UNLOCK)
+
+    # Messages during the lock don't advance it, even a correct answer
+    assert type(generate_next_agent_prompt(answer(SECOND), state)) is GiftLockedByTime
+
+    state["completed_at"] -= SECOND.unlock_after
+    assert type(generate_next_agent_prompt("hello?", state)) is DeliverNextClue
+    assert state["sub_state"] == AWAITING_ANSWER
+
+# --- HTTP FLOW ---
+
+def test_full_hunt_over_http(client):
+    opening = chat(client, "START_GAME_INIT")
+    assert FIRST.clue_question in opening['response_text']
+
+    wrong = chat(client, "definitely not it")
+    assert wrong['agent_state'] == 'smiling'
+    assert session_state(client)["history"]  # the exchange is remembered for later turns
+
+    unlocked = chat(client, answer(FIRST))
+    assert "YES! You got it right!" in unlocked['response_text']
+
+    deltas, done = chat_stream(client, "make it funnier")
+    assert deltas and "REVISED DRAFT" in done['response_text']
+    assert session_state(client)["poem"] == ''.join(deltas)
+
+    locked = chat(client, "I'm done!")
+    assert locked['unlock_pending'] is True
+    assert "time lock" in chat(client, answer(SECOND))['response_text']  # answering early doesn't count
+
+    # /events asks the browser to come back when the lock is due instead of holding a worker
+    body = client.get('/events').get_data(as_text=True)
+    assert body.startswith('retry: ') and 'event:' not in body
+
+    expire_time_lock(client)
+    body = client.get('/events').get_data(as_text=True)
+    assert body.startswith(f'event: {server.DELIVER_NEXT_CLUE_EVENT}')
+    assert SECOND.clue_question in body
+    assert client.get('/events').get_data(as_text=True).startswith('event: idle')
+
+    finished = chat(client, answer(SECOND))
+    assert finished['agent_state'] == 'smiling'
+    assert session_state(client)["gift"] == len(HUNT.gifts)
+
+def test_commands_must_describe_their_status():
+    class Incomplete(Command):
+        __slots__ = ()
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from google.genai import types
+
+from llm_cache import LLMCache, make_key
+
+def test_key_ignores_whitespace_but_not_config():
+    assert make_key("m", "  hello\n  world ") == make_key("m", "hello\nworld")
+    assert make_key("m", "hello", types.GenerateContentConfig(temperature=0.7)) != \
+        make_key("m", "hello", types.GenerateContentConfig(temperature=0.2))
+
+def test_entries_expire_after_the_ttl():
+    cache = LLMCache(ttl_seconds=0.05)
+    cache.put("k", "v")
+    assert cache.get("k") == "v"
+    time.sleep(0.06)
+    assert cache.get("k") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LLMCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+
+def test_concurrent_identical_requests_share_one_call():
+    cache = LLMCache()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(2)
+        return "reply"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["reply"] * 5
+    assert len(calls) == 1
+    assert cache.coalesced == 4
+
+def test_failures_are_not_cached():
+    cache = LLMCache()
+    assert cache.get_or_compute("k", lambda: None) is None
+    assert cache.get_or_compute("k", lambda: "later") == "later"
+
+def test_sqlite_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    LLMCache(db_path=path).put("k", "v")
+    assert LLMCache(db_path=path).get("k") == "v"
+
+def test_sqlite_tier_is_purged_and_capped(tmp_path):
+    cache = LLMCache(ttl_seconds=60, db_path=str(tmp_path / "cache.db"), max_db_rows=3, purge_interval=3600)
+    for key in "abcde":
+        cache.put(key, key)
+    cache._connect().execute("UPDATE llm_cache SET expires_at = ? WHERE key = 'e'", (time.time() - 1,))
+
+    assert cache.purge() == 2  # 'e' expired, then 'a' (soonest to expire) over the cap
+    keys = sorted(row[0] for row in cache._connect().execute("SELECT key FROM llm_cache"))
+    assert keys == ["b", "c", "d"]
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+from google.genai import errors
+
+from llm_gateway import CircuitBreaker, CircuitOpen, DeadlineExceeded, LLMGateway
+
+def upstream_error(code: int) -> errors.APIError:
+    error_class = errors.ServerError if code >= 500 else errors.ClientError
+    return error_class(code, {"error": {"code": code, "message": "test", "status": "TEST"}})
+
+def flaky(failures: int, result="ok", code: int = 503):
+    """A call that fails `failures` times with `code`, then returns `result`."""
+    calls = []
+
+    def fn():
+        calls.append(time.monotonic())
+        if len(calls) <= failures:
+            raise upstream_error(code)
+        return result
+    fn.calls = calls
+    return fn
+
+def gateway(**kwargs) -> LLMGateway:
+    kwargs.setdefault("backoff_base", 0.001)
+    return LLMGateway(**kwargs)
+
+# --- RETRIES ---
+
+def test_transient_errors_are_retried():
+    fn = flaky(2)
+    assert gateway(retries=2).call(fn) == "ok"
+    assert len(fn.calls) == 3
+
+def test_client_errors_are_not_retried_or_counted():
+    fn = flaky(5, code=400)
+    gw = gateway(retries=2, breaker=CircuitBreaker(failure_threshold=1))
+    with pytest.raises(errors.ClientError):
+        gw.call(fn)
+    assert len(fn.calls) == 1
+    assert gw.breaker.state == "closed"
+
+def test_gives_up_after_the_last_retry():
+    fn = flaky(5)
+    with pytest.raises(errors.ServerError):
+        gateway(retries=1).call(fn)
+    assert len(fn.calls) == 2
+
+# --- DEADLINES ---
+
+def test_call_deadline():
+    gw = gateway(deadline=0.1)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        gw.call(lambda: time.sleep(0.5))
+    assert time.monotonic() - started < 0.3
+
+def slow_chunks(interval: float, count: int = 5):
+    for i in range(count):
+        time.sleep(interval)
+        yield i
+
+def test_stream_deadline_is_checked_between_chunks():
+    gw = gateway(deadline=0.25, breaker=CircuitBreaker(failure_threshold=1))
+    received = []
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        for chunk in gw.stream(lambda: slow_chunks(0.1)):
+            received.append(chunk)
+    assert received == [0, 1]
+    assert time.monotonic() - started < 0.45
+    assert gw.breaker.state == "open"
+
+def test_async_stream_deadline_cuts_off_a_stalled_read():
+    async def stalled():
+        yield 0
+        await asyncio.sleep(10)
+        yield 1
+
+    async def consume(gw):
+        received = []
+        with pytest.raises(DeadlineExceeded):
+            async for chunk in gw.astream(stalled):
+                received.append(chunk)
+        return received
+
+    started = time.monotonic()
+    assert asyncio.run(consume(gateway(deadline=0.2))) == [0]
+    assert time.monotonic() - started < 0.5
+
+# --- CIRCUIT BREAKER ---
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_after=60)
+    gw = gateway(retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(errors.ServerError):
+            gw.call(flaky(1))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen):
+        gw.call(lambda: "ok")
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.05)
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()       # the probe
+    assert not breaker.allow()   # everyone else waits for it
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=3, reset_after=0.05)
+    for _ in range(3):
+        breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()  # one failure is enough while half-open
+    assert breaker.state == "open"
+    assert not breaker.allow()
@@ -0,0 +1,31 @@
+import json
+
+import loadtest
+from loadtest import compare, settings_mismatch
+
+SETTINGS = {"flows": 40, "stream": False, "url": None, "no_cache": False, "seed": 1}
+
+def test_settings_mismatch_lists_what_differs():
+    baseline = {"settings": dict(SETTINGS)}
+    assert settings_mismatch(baseline, SETTINGS) == []
+    assert settings_mismatch(baseline, {**SETTINGS, "stream": True, "flows": 10}) == [
+        "flows: 10 (baseline 40)", "stream: True (baseline False)",
+    ]
+    # Baselines saved before a setting existed don't constrain it
+    assert settings_mismatch({"settings": {"flows": 40}}, {**SETTINGS, "seed": 7}) == []
+
+def test_main_refuses_a_baseline_with_other_settings(tmp_path, capsys):
+    path = tmp_path / "bench.json"
+    path.write_text(json.dumps({"settings": {**SETTINGS, "stream": True}, "results": {}}))
+    assert loadtest.main(["--baseline", str(path), "--flows", "40"]) == 2
+    assert "stream: False (baseline True)" in capsys.readouterr().out
+
+def test_compare_flags_throughput_and_p95_regressions():
+    row = {"count": 10, "errors": 0, "p50_ms": 10, "p95_ms": 100, "p99_ms": 120}
+    baseline = {"results": {"8": {"throughput": 100.0, "branches": {"unlock": row}}}}
+    assert compare(baseline, baseline["results"], tolerance=0.2, slack_ms=5) == []
+    slower = {"8": {"throughput": 70.0, "branches": {"unlock": {**row, "p95_ms": 130}}}}
+    assert compare(baseline, slower, tolerance=0.2, slack_ms=5) == [
+        "c=8: throughput 70.0 < baseline 100.0",
+        "c=8 unlock: p95 130ms > baseline 100ms",
+    ]
@@ -0,0 +1,54 @@
+import json
+
+from metrics import LATENCY_BUCKETS, Registry, render
+
+def test_render_prometheus_text():
+    registry = Registry()
+    registry.inc("cupid_turns_total", status="FAILURE_CLUE")
+    registry.inc("cupid_turns_total", 2, status="SUCCESS_UNLOCK")
+    registry.observe("cupid_llm_seconds", 0.03, site="chat")
+    registry.add_collector(lambda: [("cupid_memory_tokens_saved_total", {}, 12)])
+
+    lines = render(registry.snapshot()).splitlines()
+    assert lines[:3] == [
+        "# HELP cupid_llm_seconds Upstream LLM call latency by call site.",
+        "# TYPE cupid_llm_seconds histogram",
+        'cupid_llm_seconds_bucket{le="0.005",site="chat"} 0',
+    ]
+    assert 'cupid_llm_seconds_bucket{le="0.05",site="chat"} 1' in lines
+    assert 'cupid_llm_seconds_bucket{le="+Inf",site="chat"} 1' in lines
+    assert 'cupid_llm_seconds_sum{site="chat"} 0.03' in lines
+    assert 'cupid_llm_seconds_count{site="chat"} 1' in lines
+    assert "# TYPE cupid_memory_tokens_saved_total counter" in lines
+    assert "cupid_memory_tokens_saved_total 12" in lines
+    assert lines[-2:] == [
+        'cupid_turns_total{status="FAILURE_CLUE"} 1',
+        'cupid_turns_total{status="SUCCESS_UNLOCK"} 2',
+    ]
+
+def test_render_escapes_label_values():
+    text = render({"counters": [["cupid_http_requests_total", {"route": 'a"b\\c'}, 1]], "histograms": []})
+    assert 'cupid_http_requests_total{route="a\\"b\\\\c"} 1' in text
+
+def test_collect_merges_every_worker_snapshot(tmp_path):
+    other_worker = Registry()
+    other_worker.inc("cupid_turns_total", 3, status="FAILURE_CLUE")
+    other_worker.inc("cupid_unlock_pushes_total")
+    other_worker.observe("cupid_llm_seconds", 2.0, site="chat")
+    (tmp_path / "metrics-1.json").write_text(json.dumps(other_worker.snapshot()))
+    (tmp_path / "metrics-2.json").write_text("{not json")  # a worker mid-write is skipped
+
+    registry = Registry()
+    registry.configure(str(tmp_path))
+    registry.inc("cupid_turns_total", status="FAILURE_CLUE")
+    registry.observe("cupid_llm_seconds", 0.02, site="chat")
+
+    merged = registry.collect()
+    counters = {(name, tuple(labels.items())): value for name, labels, value in merged["counters"]}
+    assert counters == {
+        ("cupid_turns_total", (("status", "FAILURE_CLUE"),)): 4,
+        ("cupid_unlock_pushes_total", ()): 1,
+    }
+    (name, labels, hist), = merged["histograms"]
+    assert hist[-1] == 2 and hist[-2] == 2.02
+    assert hist[LATENCY_BUCKETS.index(0.025)] == 1 and hist[LATENCY_BUCKETS.index(2.5)] == 2
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from pregen import TONE_REQUESTS, Pregenerator, match_tone
+
+class FakeGift:
+    def __init__(self, id):
+        self.id = id
+
+def settle(pool: Pregenerator):
+    """Waits for everything queued so far (the pools below use one worker)."""
+    pool._executor.submit(lambda: None).result()
+
+# --- TONE MATCHING ---
+
+@pytest.mark.parametrize("request_text, tone", [
+    ("Reply to it and make it funnier", "funny"),
+    ("make it super romantic please", "romantic"),
+    ("roast Harsh's poetry skills", "roast"),
+    ("funnier, and mention the pizza", None),
+    ("make it funny and romantic", None),
+    ("add a rhyme about cats", None),
+])
+def test_match_tone(request_text, tone):
+    assert match_tone(request_text) == tone
+
+# --- POOL ---
+
+def test_rewrites_are_served_only_for_canned_tones():
+    pool = Pregenerator(lambda poem, request: f"{poem} / {request}", lambda gift, n: None)
+    pool.prepare_rewrites("roses")
+    pool._executor.shutdown(wait=True)
+    assert pool.take_rewrite("roses", "make it funnier") == "roses / Reply to it and make it funnier"
+    assert pool.take_rewrite("roses", "make it funnier with cats") is None
+    assert pool.take_rewrite("violets", "make it funnier") is None
+
+def test_hints_rotate_across_variants():
+    pool = Pregenerator(lambda poem, request: None, lambda gift, n: f"hint {n}")
+    pool.prepare_hints([FakeGift(1)], per_clue=3)
+    pool._executor.shutdown(wait=True)
+    assert [pool.take_hint(1) for _ in range(4)] == ["hint 0", "hint 1", "hint 2", "hint 0"]
+    assert pool.take_hint(2) is None
+
+def test_failed_hints_are_regenerated():
+    upstream_up = threading.Event()
+
+    def hint(gift, n):
+        if not upstream_up.is_set():
+            raise RuntimeError("upstream down")
+        return f"hint {n}"
+
+    pool = Pregenerator(lambda poem, request: None, hint, max_workers=1, retry_after=0)
+    pool.prepare_hints([FakeGift(1)], per_clue=2)
+    settle(pool)
+    assert pool.take_hint(1) is None  # resubmits the failed hints
+
+    upstream_up.set()
+    pool.take_hint(1)
+    settle(pool)
+    assert pool.take_hint(1) in ("hint 0", "hint 1")
+
+def test_failed_pinned_rewrites_recover_when_prepared_again():
+    upstream_up = threading.Event()
+
+    def rewrite(poem, request):
+        if not upstream_up.is_set():
+            raise RuntimeError("upstream down")
+        return f"{poem} / {request}"
+
+    pool = Pregenerator(rewrite, lambda gift, n: None, max_workers=1, retry_after=0)
+    pool.prepare_rewrites("roses", pinned=True)
+    settle(pool)  # the failing first attempts have finished
+    assert pool.take_rewrite("roses", "make it funnier") is None
+
+    upstream_up.set()
+    pool.prepare_rewrites("roses", pinned=True)
+    settle(pool)
+    assert pool.take_rewrite("roses", "make it funnier") == "roses / Reply to it and make it funnier"
+
+def test_failed_rewrites_wait_for_retry_after():
+    calls = []
+
+    def rewrite(poem, request):
+        calls.append(request)
+        raise RuntimeError("upstream down")
+
+    pool = Pregenerator(rewrite, lambda gift, n: None, max_workers=1, retry_after=3600)
+    pool.prepare_rewrites("roses")
+    settle(pool)
+    pool.prepare_rewrites("roses")  # first retry is immediate
+    settle(pool)
+    pool.prepare_rewrites("roses")  # then throttled
+    pool.take_rewrite("roses", "make it funnier")
+    settle(pool)
+    assert len(calls) == 2 * len(TONE_REQUESTS)
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore
+
+SESSION = "a" * 32
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"))
+
+def test_transaction_saves_changes(store):
+    with store.transaction(SESSION) as state:
+        state["gift"] = 1
+    with store.transaction(SESSION) as state:
+        assert state["gift"] == 1
+
+def test_transaction_rolls_back_on_exception(store):
+    with store.transaction(SESSION) as state:
+        state["gift"] = 1
+    with pytest.raises(RuntimeError):
+        with store.transaction(SESSION) as state:
+            state["gift"] = 2
+            raise RuntimeError("LLM call failed mid-turn")
+    with store.transaction(SESSION) as state:
+        assert state["gift"] == 1
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemorySessionStore(max_sessions=2)
+    for session_id in ("a" * 32, "b" * 32, "c" * 32):
+        with store.transaction(session_id) as state:
+            state["gift"] = 1
+    with store.transaction("a" * 32) as state:
+        assert state["gift"] == 0  # evicted, so a fresh game
+
+def test_sqlite_store_prunes_expired_sessions(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), max_age=60)
+    with store.transaction("a" * 32):
+        pass
+    with store.transaction("b" * 32):
+        pass
+    store._connect().execute("UPDATE sessions SET updated_at = ? WHERE id = ?", (time.time() - 61, "a" * 32))
+
+    assert store.prune() == 1
+    ids = [row[0] for row in store._connect().execute("SELECT id FROM sessions")]
+    assert ids == ["b" * 32]
+
+def test_peek_reads_without_saving(store):
+    assert store.peek(SESSION)["gift"] == 0
+    with store.transaction(SESSION) as state:
+        state["gift"] = 1
+    peeked = store.peek(SESSION)
+    assert peeked["gift"] == 1
+    peeked["gift"] = 2  # a copy: changing it doesn't touch the store
+    assert store.peek(SESSION)["gift"] == 1
+
+def test_sqlite_peek_does_not_create_rows(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+    store.peek(SESSION)
+    assert store._connect().execute("SELECT COUNT(*) FROM sessions").fetchone() == (0,)
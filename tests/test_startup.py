@@ -0,0 +1,26 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+BACKEND = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'backend')
+
+LAZY_SESSION = textwrap.dedent('''
+    import sys
+    import app
+
+    client = app.app.test_client()
+    app.warmup()
+    assert client.post('/chat', json={'message': 'START_GAME_INIT'}).status_code == 200
+    print('google.genai' in sys.modules)
+    assert client.post('/chat', json={'message': 'not the answer'}).status_code == 200
+    print('google.genai' in sys.modules)
+''')
+
+def test_lazy_mode_imports_the_sdk_on_the_first_llm_turn():
+    # A fresh interpreter: the rest of the suite has already imported google.genai
+    env = {**os.environ, 'STARTUP_MODE': 'lazy', 'PREGEN_ENABLED': '1', 'PYTHONPATH': BACKEND}
+    result = subprocess.run([sys.executable, '-c', LAZY_SESSION], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    checks = [line for line in result.stdout.splitlines() if line in ('True', 'False')]
+    assert checks == ['False', 'True']
@@ -0,0 +1,46 @@
+import pytest
+
+import app as server
+
+@pytest.fixture
+def client():
+    server.static_assets.ensure_built()
+    return server.app.test_client()
+
+def inline_audio() -> str:
+    return next(path for path in server.static_assets.assets if path.startswith('media/inline.') and path.endswith('.mp3'))
+
+def test_session_cookie_is_not_set_on_public_assets(client):
+    hashed = server.static_assets.fingerprints['scripts/main.js']
+    response = client.get('/' + hashed)
+    assert response.status_code == 200
+    assert 'immutable' in response.headers['Cache-Control']
+    assert 'Set-Cookie' not in response.headers
+    assert 'Set-Cookie' in client.get('/').headers
+
+def test_inline_audio_supports_byte_ranges(client):
+    path = inline_audio()
+    data = server.static_assets.assets[path].data
+
+    full = client.get('/' + path)
+    assert full.status_code == 200 and full.headers['Accept-Ranges'] == 'bytes'
+    assert full.data == data
+
+    # Safari probes with bytes=0-1 before streaming the rest
+    probe = client.get('/' + path, headers={'Range': 'bytes=0-1'})
+    assert probe.status_code == 206
+    assert probe.headers['Content-Range'] == f'bytes 0-1/{len(data)}'
+    assert probe.data == data[:2]
+
+    tail = client.get('/' + path, headers={'Range': 'bytes=2-'})
+    assert tail.status_code == 206 and tail.data == data[2:]
+
+    assert client.get('/' + path, headers={'Range': f'bytes={len(data)}-'}).status_code == 416
+
+def test_ranges_respect_etags(client):
+    path = inline_audio()
+    etag = client.get('/' + path).headers['ETag']
+    assert client.get('/' + path, headers={'If-None-Match': etag}).status_code == 304
+    # A stale If-Range gets the whole (new) file instead of a mismatched slice
+    stale = client.get('/' + path, headers={'Range': 'bytes=0-1', 'If-Range': '"stale"'})
+    assert stale.status_code == 200 and stale.data == server.static_assets.assets[path].data
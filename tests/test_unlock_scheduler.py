@@ -0,0 +1,61 @@
+import queue
+import time
+
+from unlock_scheduler import UnlockScheduler
+
+SESSION = "a" * 32
+
+def due_in(seconds: float):
+    deadline = time.time() + seconds
+    return lambda session_id: deadline
+
+def test_delivers_to_subscribers_when_due():
+    delivered = []
+
+    def deliver(session_id):
+        delivered.append(session_id)
+        return {"response_text": "next clue"}
+
+    scheduler = UnlockScheduler(due_in(0.05), deliver)
+    replies = queue.Queue()
+    assert scheduler.subscribe(SESSION, replies.put) is not None
+    assert replies.get(timeout=2) == {"response_text": "next clue"}
+    assert delivered == [SESSION]
+    assert scheduler.stats() == {"pending": 0, "sessions": 0}
+
+def test_nothing_pending_returns_none():
+    scheduler = UnlockScheduler(lambda session_id: None, lambda session_id: None)
+    assert scheduler.subscribe(SESSION, lambda reply: None) is None
+
+def test_unsubscribed_sessions_are_not_unlocked():
+    delivered = []
+    scheduler = UnlockScheduler(due_in(0.05), lambda session_id: delivered.append(session_id))
+    for _ in range(10):
+        scheduler.subscribe(SESSION, lambda reply: None)()  # reconnecting clients
+    assert scheduler.stats() == {"pending": 0, "sessions": 0}
+    time.sleep(0.15)
+    assert delivered == []
+
+def test_failed_delivery_is_retried():
+    failures = [2]
+
+    def deliver(session_id):
+        if failures[0]:
+            failures[0] -= 1
+            raise RuntimeError("database is locked")
+        return {"response_text": "next clue"}
+
+    scheduler = UnlockScheduler(due_in(0), deliver, retry_base=0.02)
+    replies = queue.Queue()
+    scheduler.subscribe(SESSION, replies.put)
+    assert replies.get(timeout=2) == {"response_text": "next clue"}
+
+def test_subscribers_are_released_when_delivery_keeps_failing():
+    def deliver(session_id):
+        raise RuntimeError("database is locked")
+
+    scheduler = UnlockScheduler(due_in(0), deliver, retry_base=0.01, max_attempts=3)
+    replies = queue.Queue()
+    scheduler.subscribe(SESSION, replies.put)
+    assert replies.get(timeout=2) is None
+    assert scheduler.stats() == {"pending": 0, "sessions": 0}